@@ -0,0 +1,60 @@
+import numpy as np
+
+# Caps below this are scored count by count, one NumPy call beats computing the step edges
+ANALYTIC_MIN_CAP = 1024
+
+def solve_single_troop(problem, stats: dict = None):
+    """
+    Closed-form optimum of a one-troop army, the same army and score as scoring every count
+
+    With one troop the army faces one defense D, so the loss percentage is
+    100 * (D / (n * attack)) ** 1.5 and the rounded losses are round(K / sqrt(n)) with
+    K = (D / attack) ** 1.5, a staircase falling in n. The army-size term grows linearly, so
+    the optimum is the first count of some step: the smallest n with K / sqrt(n) < r + 0.5 is
+    floor(K² / (r + 0.5)²) + 1 for every loss count r the caps allow. Those counts and their
+    neighbours, which absorb float rounding at the step edges, are scored exactly and the
+    lowest wins, ties going to the smaller army. Steps losing more than the full-cap army
+    scores are skipped. Below ANALYTIC_MIN_CAP, or when the staircase still has about as many
+    steps as the cap has counts, every count is scored instead.
+
+    Parameters:
+    - problem: compiled problem with one troop, its limit must be finite
+    - stats: optional dict that gets "evaluations" and "infeasible" set
+
+    Returns (best_counts, best_score)
+    """
+
+    (troop,), (limit,) = problem.troops, problem.limits
+    cap = max(0, int(limit))
+    attack = float(problem.attack[0])
+    defense = problem.cav_def if problem.is_cavalry[0] else problem.inf_def
+    stats = {} if stats is None else stats
+
+    # Step 1: Step edges of the loss staircase between one unit and the cap, an army losing
+    # more than the full-cap army scores can never win while the army-size term is not negative
+    evaluations = 0
+    if cap < ANALYTIC_MIN_CAP or attack <= 0:
+        counts = np.arange(1, cap + 1)
+    else:
+        scale = (defense / attack) ** 1.5
+        top = round(scale)
+        if problem.army_size_penalty_coefficient >= 0 and problem.cavalry_penalty_coefficient >= 0:
+            full, _, _ = problem.evaluate([[cap]])
+            evaluations += 1
+            top = min(top, int(full[0] // problem.terms[0][1]))
+        steps = np.arange(round(scale / cap ** 0.5), top + 1)
+        if 3 * len(steps) >= cap:
+            counts = np.arange(1, cap + 1)
+        else:
+            edges = np.floor(scale ** 2 / (steps + 0.5) ** 2).astype(np.int64) + 1
+            counts = np.unique(np.clip(np.concatenate([edges - 1, edges, edges + 1, [1, cap]]), 1, cap))
+
+    # Step 2: Score the candidates, argmin keeps the smallest count among ties
+    scores, _, _ = problem.evaluate(counts[:, None])
+    stats["evaluations"] = evaluations + len(counts)
+    stats["infeasible"] = int(np.isinf(scores).sum())
+    if not len(counts) or np.isinf(scores.min()):
+        return {troop: 0}, float("inf")
+
+    best = int(np.argmin(scores))
+    return {troop: int(counts[best])}, float(scores[best])
@@ -1,10 +1,48 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import math
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from troops_optimizer import run_simulated_annealing
-from troops_config import TROOPS_TABLE
+from batch_loss import loss_function_batch
+from batch_optimizer import iter_farm_list, optimize_farm_list
+from job_queue import JobQueue, QueueFullError
+from oasis_parser import parse_oasis_reports
+from metrics import Counter, Gauge, Histogram, Registry
+from modifiers import PERCENT_MODIFIERS, modifiers_key
+from pareto import pareto_front
+from raid_planner import plan_raids
+from robust import DEFAULT_DRIFT, DEFAULT_SPAWN_RATE, RISKS, robust_optimize
+from sensitivity import level_sensitivity
+from result_cache import PersistentStore, ResultCache, SingleFlight, canonical_request_key
+from troops_optimizer import ENGINES, run_simulated_annealing, warm_up
+from troops_config import DEFAULT_PROFILE, ProfileError, list_profiles, load_profile
 from fastapi.middleware.cors import CORSMiddleware
+import worker_pool
+
+# Set once the background warm-up has loaded the solvers, health checks answer before that
+solver_ready = threading.Event()
+warm_up_ms = {}
+
+def warm_up_solvers():
+    start = time.perf_counter()
+    warm_up_ms.update(warm_up())
+    # Fork the batch workers after the warm-up so they inherit the loaded solvers
+    if worker_pool.MAX_WORKERS > 1:
+        worker_pool.start_workers()
+    warm_up_ms["total"] = (time.perf_counter() - start) * 1000
+    solver_ready.set()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    threading.Thread(target=warm_up_solvers, name="solver-warm-up", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,6 +51,92 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+optimize_cache = ResultCache(store=PersistentStore())
+optimize_flights = SingleFlight()
+jobs = JobQueue()
+
+registry = Registry()
+http_requests = registry.register(Counter(
+    "http_requests", "HTTP requests served", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+optimizer_runs = registry.register(Counter(
+    "optimizer_runs", "Optimizer runs by the engine that produced the army", ("engine",)))
+optimizer_evaluations = registry.register(Counter(
+    "optimizer_evaluations", "Objective evaluations spent by optimizer runs", ("engine",)))
+optimizer_infeasible = registry.register(Counter(
+    "optimizer_infeasible_evaluations", "Objective evaluations that scored inf", ("engine",)))
+optimizer_phases = registry.register(Histogram(
+    "optimizer_phase_duration_seconds", "Wall time per optimizer phase", ("engine", "phase")))
+registry.register(Gauge("solver_ready", "1 once the solver warm-up finished",
+                        lambda: int(solver_ready.is_set())))
+registry.register(Gauge("optimize_cache_entries", "Results held by the optimize cache",
+                        lambda: optimize_cache.stats()["size"]))
+registry.register(Gauge("optimize_cache_hits", "Optimize cache hits since start",
+                        lambda: optimize_cache.stats()["hits"]))
+registry.register(Gauge("optimize_cache_misses", "Optimize cache misses since start",
+                        lambda: optimize_cache.stats()["misses"]))
+registry.register(Gauge("optimize_cache_disk_hits", "Optimize cache hits served from the shared disk store",
+                        lambda: optimize_cache.disk_hits))
+optimize_coalesced = registry.register(Counter(
+    "optimize_coalesced_requests", "Optimize requests answered by an identical request already in flight"))
+# Unlabelled, so it can export 0 from the start and rate() sees data before the first coalesced request
+optimize_coalesced.inc(0)
+registry.register(Gauge("optimize_in_flight", "Distinct optimizations running for /api/v1/optimize",
+                        lambda: optimize_flights.stats()["in_flight"]))
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so job ids do not blow up the series count
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    http_requests.inc(method=request.method, route=path, status=response.status_code)
+    http_latency.observe(time.perf_counter() - start, method=request.method, route=path)
+    return response
+
+def record_optimizer_metrics(diagnostics: dict):
+    engine = diagnostics["engine"]
+    optimizer_runs.inc(engine=engine)
+    optimizer_evaluations.inc(diagnostics["nfev"] or 0, engine=engine)
+    optimizer_infeasible.inc(diagnostics["infeasible_evaluations"] or 0, engine=engine)
+    for phase, elapsed_ms in diagnostics["phases_ms"].items():
+        optimizer_phases.observe(elapsed_ms / 1000, engine=engine, phase=phase)
+
+# Largest farm list accepted by /api/v1/optimize/batch
+MAX_FARM_LIST_SIZE = 500
+
+# Largest farm list accepted by /api/v1/optimize/stream, results are not held in memory
+MAX_STREAM_SIZE = 20000
+
+# Media types of /api/v1/optimize/stream by format
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+# Most annealing starts a single request may ask for
+MAX_STARTS = 32
+
+# Longest time budget a request may ask for, in milliseconds
+MAX_TIME_BUDGET_MS = 600000
+
+# Most arrival scenarios /api/v1/optimize/robust samples per request
+MAX_SCENARIOS = 20000
+
+# Most oases /api/v1/sensitivity judges per request, each costs 1 + 2 * len(troops) exact solves
+MAX_SENSITIVITY_OASES = 50
+
+# Budget of a /api/v1/sensitivity request that sets none, it holds a server thread throughout
+DEFAULT_SENSITIVITY_BUDGET_MS = 30000
+
+# Largest per-troop cap a request may set, the exact engine scans every count up to it
+MAX_TROOP_LIMIT = 100000
+
+class AttackModifiers(BaseModel):
+    hero_offense_percent: float = 0.0
+    metallurgy_percent: float = 0.0
+    animal_bonus_percent: float = 0.0
+    weapon_bonus: dict[str, float] = {}
+
 class OptimizationRequest(BaseModel):
     tribe: str
     troops: list[str]
@@ -21,22 +145,124 @@ class OptimizationRequest(BaseModel):
     max_troop_limit: dict[str, int]
     army_coeff: float
     cav_coeff: float
+    engine: str = "auto"
+    profile: str = DEFAULT_PROFILE
+    diagnostics: bool = False
+    warm_start: dict[str, int] | None = None
+    starts: int = 1
+    time_budget_ms: float | None = None
+    modifiers: AttackModifiers | None = None
 
-@app.post("/api/v1/optimize")
-def optimize_troops(req: OptimizationRequest):
-    if req.tribe not in TROOPS_TABLE:
-        raise HTTPException(status_code=400, detail=f"Unknown tribe: {req.tribe}")
+class OptimizationJobRequest(OptimizationRequest):
+    max_iter: int = 100
 
-    tribe_data = TROOPS_TABLE[req.tribe]
+class FarmListRequest(BaseModel):
+    tribe: str
+    troops: list[str]
+    troop_levels: dict[str, int]
+    oasis_compositions: list[dict[str, int]]
+    max_troop_limit: dict[str, int]
+    army_coeff: float
+    cav_coeff: float
+    engine: str = "auto"
+    profile: str = DEFAULT_PROFILE
+
+class ReportParseRequest(BaseModel):
+    text: str
+
+class ReportBatchRequest(BaseModel):
+    tribe: str
+    troops: list[str]
+    troop_levels: dict[str, int]
+    reports: str
+    max_troop_limit: dict[str, int]
+    army_coeff: float
+    cav_coeff: float
+    engine: str = "auto"
+    profile: str = DEFAULT_PROFILE
 
-    if not req.troops:
+class ParetoRequest(BaseModel):
+    tribe: str
+    troops: list[str]
+    troop_levels: dict[str, int]
+    oasis_composition: dict[str, int]
+    max_troop_limit: dict[str, int]
+    cavalry_weight: float = 1.0
+    profile: str = DEFAULT_PROFILE
+
+class RobustRequest(BaseModel):
+    tribe: str
+    troops: list[str]
+    troop_levels: dict[str, int]
+    oasis_composition: dict[str, int]
+    max_troop_limit: dict[str, int]
+    army_coeff: float
+    cav_coeff: float
+    scenarios: int = 2000
+    drift: float = DEFAULT_DRIFT
+    spawn_rate: float = DEFAULT_SPAWN_RATE
+    risk: str = "expected"
+    alpha: float = 0.1
+    seed: int = 42
+    profile: str = DEFAULT_PROFILE
+    modifiers: AttackModifiers | None = None
+
+class SensitivityRequest(BaseModel):
+    tribe: str
+    troops: list[str]
+    troop_levels: dict[str, int]
+    oasis_compositions: list[dict[str, int]]
+    max_troop_limit: dict[str, int]
+    army_coeff: float
+    cav_coeff: float
+    profile: str = DEFAULT_PROFILE
+    modifiers: AttackModifiers | None = None
+    time_budget_ms: float | None = None
+
+class OasisTarget(BaseModel):
+    oasis_composition: dict[str, int]
+    value: float
+
+class RaidPlanRequest(BaseModel):
+    tribe: str
+    troops: list[str]
+    troop_levels: dict[str, int]
+    available_troops: dict[str, int]
+    oases: list[OasisTarget]
+    army_coeff: float
+    cav_coeff: float
+    profile: str = DEFAULT_PROFILE
+
+class EvaluationRequest(BaseModel):
+    tribe: str
+    troops: list[str]
+    troop_levels: dict[str, int]
+    oasis_composition: dict[str, int]
+    armies: list[list[int]]
+    army_coeff: float
+    cav_coeff: float
+    max_troop_limit: dict[str, int] | None = None
+    profile: str = DEFAULT_PROFILE
+
+def validate_troops(tribe: str, troops: list[str], troop_levels: dict[str, int], profile: str = DEFAULT_PROFILE):
+    try:
+        troops_table = load_profile(profile).troops_table
+    except ProfileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if tribe not in troops_table:
+        raise HTTPException(status_code=400, detail=f"Unknown tribe: {tribe}")
+
+    tribe_data = troops_table[tribe]
+
+    if not troops:
         raise HTTPException(status_code=400, detail="troops list must not be empty")
 
-    for troop in req.troops:
+    for troop in troops:
         if troop not in tribe_data:
-            raise HTTPException(status_code=400, detail=f"Unknown troop '{troop}' for tribe '{req.tribe}'")
+            raise HTTPException(status_code=400, detail=f"Unknown troop '{troop}' for tribe '{tribe}'")
 
-        level = req.troop_levels.get(troop, 1)
+        level = troop_levels.get(troop, 1)
         max_level = len(tribe_data[troop]["attack"])
         if level < 1 or level > max_level:
             raise HTTPException(
@@ -44,10 +270,248 @@ def optimize_troops(req: OptimizationRequest):
                 detail=f"Level {level} for '{troop}' is out of range [1, {max_level}]"
             )
 
-        if troop not in req.max_troop_limit:
+def validate_army(tribe: str, troops: list[str], troop_levels: dict[str, int],
+                  max_troop_limit: dict[str, int], engine: str | None = None,
+                  profile: str = DEFAULT_PROFILE):
+    if engine is not None and engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown engine: {engine}")
+
+    validate_troops(tribe, troops, troop_levels, profile)
+
+    for troop in troops:
+        if troop not in max_troop_limit:
             raise HTTPException(status_code=400, detail=f"max_troop_limit missing entry for '{troop}'")
+        if not 0 <= max_troop_limit[troop] <= MAX_TROOP_LIMIT:
+            raise HTTPException(status_code=400, detail=f"max_troop_limit for '{troop}' must be in [0, {MAX_TROOP_LIMIT}]")
+
+def validate_starts(starts: int):
+    if starts < 1 or starts > MAX_STARTS:
+        raise HTTPException(status_code=400, detail=f"starts must be in [1, {MAX_STARTS}]")
+
+def validate_time_budget(time_budget_ms: float | None):
+    if time_budget_ms is not None and not 0 < time_budget_ms <= MAX_TIME_BUDGET_MS:
+        raise HTTPException(status_code=400, detail=f"time_budget_ms must be in (0, {MAX_TIME_BUDGET_MS}]")
+
+def validate_warm_start(troops: list[str], warm_start: dict[str, int] | None):
+    if warm_start is None:
+        return
+
+    for troop, count in warm_start.items():
+        if troop not in troops:
+            raise HTTPException(status_code=400, detail=f"warm_start has unknown troop '{troop}'")
+        if count < 0:
+            raise HTTPException(status_code=400, detail=f"warm_start count for '{troop}' must not be negative")
+
+def validate_modifiers(troops: list[str], modifiers: AttackModifiers | None):
+    if modifiers is None:
+        return
+
+    for name in PERCENT_MODIFIERS:
+        if getattr(modifiers, name) < 0:
+            raise HTTPException(status_code=400, detail=f"{name} must not be negative")
+
+    for troop, bonus in modifiers.weapon_bonus.items():
+        if troop not in troops:
+            raise HTTPException(status_code=400, detail=f"weapon_bonus has unknown troop '{troop}'")
+        if bonus < 0:
+            raise HTTPException(status_code=400, detail=f"weapon_bonus for '{troop}' must not be negative")
+
+@app.post("/api/v1/optimize")
+def optimize_troops(req: OptimizationRequest):
+    start = time.perf_counter()
+    validate_army(req.tribe, req.troops, req.troop_levels, req.max_troop_limit, req.engine, req.profile)
+    validate_warm_start(req.troops, req.warm_start)
+    validate_starts(req.starts)
+    validate_time_budget(req.time_budget_ms)
+    validate_modifiers(req.troops, req.modifiers)
+    modifiers = req.modifiers.model_dump() if req.modifiers is not None else None
+    validation_ms = (time.perf_counter() - start) * 1000
+
+    cache_key = canonical_request_key(
+        req.tribe, req.troops, req.troop_levels, req.oasis_composition, req.max_troop_limit,
+        req.army_coeff, req.cav_coeff, req.engine,
+        {"starts": req.starts, "profile": req.profile, "modifiers": modifiers_key(modifiers)}
+    )
+    cached = optimize_cache.get(cache_key)
+    if cached is not None:
+        if req.diagnostics:
+            return {**cached, "diagnostics": {"cache_hit": True, "phases_ms": {"validation": validation_ms}}}
+        return cached
+
+    def solve():
+        # Diagnostics are always collected for the metrics, the cache keeps results without them
+        result = run_simulated_annealing(
+            tribe=req.tribe,
+            troops=req.troops,
+            troop_levels=req.troop_levels,
+            oasis_composition=req.oasis_composition,
+            max_troop_limit=req.max_troop_limit,
+            army_size_penalty_coefficient=req.army_coeff,
+            cavalry_penalty_coefficient=req.cav_coeff,
+            max_iter=100,
+            engine=req.engine,
+            diagnostics=True,
+            warm_start=req.warm_start,
+            starts=req.starts,
+            time_budget_ms=req.time_budget_ms,
+            profile=req.profile,
+            modifiers=modifiers
+        )
+        diagnostics = result.pop("diagnostics")
+        record_optimizer_metrics(diagnostics)
+        # Warm-started results depend on the prior army and cut-short ones on the machine's load,
+        # only complete cold results are shared. Those match an unbudgeted run, so the budget
+        # stays out of the key. Table answers are not converged either, a lookup costs less than
+        # a cache round trip.
+        if req.warm_start is None and result["converged"]:
+            optimize_cache.put(cache_key, result)
+        return result, diagnostics
+
+    # Identical requests arriving while one is solving wait for it instead of annealing again,
+    # the flight key adds what the cache key leaves out
+    flight_key = (cache_key, tuple(sorted(req.warm_start.items())) if req.warm_start is not None else None, req.time_budget_ms)
+    (result, diagnostics), coalesced = optimize_flights.do(flight_key, solve)
+    if coalesced:
+        optimize_coalesced.inc()
+
+    if req.diagnostics:
+        phases_ms = {"validation": validation_ms, **diagnostics["phases_ms"]}
+        return {**result, "diagnostics": {"cache_hit": False, **diagnostics, "coalesced": coalesced, "phases_ms": phases_ms}}
+    return result
+
+@app.post("/api/v1/optimize/batch")
+def optimize_farm_list_troops(req: FarmListRequest):
+    # The army spec is shared by every oasis, so it is validated once
+    validate_army(req.tribe, req.troops, req.troop_levels, req.max_troop_limit, req.engine, req.profile)
 
-    result = run_simulated_annealing(
+    if not req.oasis_compositions:
+        raise HTTPException(status_code=400, detail="oasis_compositions must not be empty")
+    if len(req.oasis_compositions) > MAX_FARM_LIST_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FARM_LIST_SIZE} oases per batch")
+
+    return optimize_farm_list(
+        tribe=req.tribe,
+        troops=req.troops,
+        troop_levels=req.troop_levels,
+        oasis_compositions=req.oasis_compositions,
+        max_troop_limit=req.max_troop_limit,
+        army_size_penalty_coefficient=req.army_coeff,
+        cavalry_penalty_coefficient=req.cav_coeff,
+        max_iter=100,
+        engine=req.engine,
+        cache=optimize_cache,
+        profile=req.profile
+    )
+
+@app.post("/api/v1/oases/parse")
+def parse_oasis_text(req: ReportParseRequest):
+    return {"oases": parse_oasis_reports(req.text)}
+
+@app.post("/api/v1/optimize/reports")
+def optimize_report_troops(req: ReportBatchRequest):
+    validate_army(req.tribe, req.troops, req.troop_levels, req.max_troop_limit, req.engine, req.profile)
+
+    oases = parse_oasis_reports(req.reports)
+    if not oases:
+        raise HTTPException(status_code=400, detail="No oasis found in reports")
+    if len(oases) > MAX_FARM_LIST_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FARM_LIST_SIZE} oases per batch")
+
+    batch = optimize_farm_list(
+        tribe=req.tribe,
+        troops=req.troops,
+        troop_levels=req.troop_levels,
+        oasis_compositions=[oasis["oasis_composition"] for oasis in oases],
+        max_troop_limit=req.max_troop_limit,
+        army_size_penalty_coefficient=req.army_coeff,
+        cavalry_penalty_coefficient=req.cav_coeff,
+        max_iter=100,
+        engine=req.engine,
+        cache=optimize_cache,
+        profile=req.profile
+    )
+    for oasis, item in zip(oases, batch["results"]):
+        item["coordinates"] = oasis["coordinates"]
+    return batch
+
+@app.post("/api/v1/optimize/stream")
+def stream_farm_list_troops(req: FarmListRequest, format: str = "ndjson"):
+    validate_army(req.tribe, req.troops, req.troop_levels, req.max_troop_limit, req.engine, req.profile)
+
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(STREAM_FORMATS)}")
+    if not req.oasis_compositions:
+        raise HTTPException(status_code=400, detail="oasis_compositions must not be empty")
+    if len(req.oasis_compositions) > MAX_STREAM_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STREAM_SIZE} oases per stream")
+
+    items = iter_farm_list(
+        tribe=req.tribe,
+        troops=req.troops,
+        troop_levels=req.troop_levels,
+        oasis_compositions=req.oasis_compositions,
+        max_troop_limit=req.max_troop_limit,
+        army_size_penalty_coefficient=req.army_coeff,
+        cavalry_penalty_coefficient=req.cav_coeff,
+        max_iter=100,
+        engine=req.engine,
+        cache=optimize_cache,
+        profile=req.profile
+    )
+
+    # One line per oasis as it finishes, "index" maps it back to oasis_compositions
+    def lines():
+        for item in items:
+            if format == "sse":
+                yield f"data: {json.dumps(item)}\n\n"
+            else:
+                yield json.dumps(item) + "\n"
+
+    return StreamingResponse(lines(), media_type=STREAM_FORMATS[format])
+
+@app.post("/api/v1/pareto")
+def pareto_troops(req: ParetoRequest):
+    validate_army(req.tribe, req.troops, req.troop_levels, req.max_troop_limit, profile=req.profile)
+
+    if req.cavalry_weight < 0:
+        raise HTTPException(status_code=400, detail="cavalry_weight must not be negative")
+
+    return pareto_front(
+        tribe=req.tribe,
+        troops=req.troops,
+        troop_levels=req.troop_levels,
+        oasis_composition=req.oasis_composition,
+        max_troop_limit=req.max_troop_limit,
+        cavalry_weight=req.cavalry_weight,
+        profile=req.profile
+    )
+
+@app.post("/api/v1/optimize/robust")
+def optimize_robust_troops(req: RobustRequest):
+    validate_army(req.tribe, req.troops, req.troop_levels, req.max_troop_limit, profile=req.profile)
+    validate_modifiers(req.troops, req.modifiers)
+
+    if not 1 <= req.scenarios <= MAX_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"scenarios must be in [1, {MAX_SCENARIOS}]")
+    if req.risk not in RISKS:
+        raise HTTPException(status_code=400, detail=f"Unknown risk: {req.risk}")
+    if not 0 < req.alpha <= 1:
+        raise HTTPException(status_code=400, detail="alpha must be in (0, 1]")
+    if req.drift < 0 or req.spawn_rate < 0:
+        raise HTTPException(status_code=400, detail="drift and spawn_rate must not be negative")
+    modifiers = req.modifiers.model_dump() if req.modifiers is not None else None
+
+    # Same seed, same scenarios, so robust results are as cacheable as deterministic ones
+    options = {name: getattr(req, name) for name in ("scenarios", "drift", "spawn_rate", "risk", "alpha", "seed", "profile")}
+    cache_key = canonical_request_key(
+        req.tribe, req.troops, req.troop_levels, req.oasis_composition, req.max_troop_limit,
+        req.army_coeff, req.cav_coeff, "robust", {**options, "modifiers": modifiers_key(modifiers)}
+    )
+    cached = optimize_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    result = robust_optimize(
         tribe=req.tribe,
         troops=req.troops,
         troop_levels=req.troop_levels,
@@ -55,6 +519,175 @@ def optimize_troops(req: OptimizationRequest):
         max_troop_limit=req.max_troop_limit,
         army_size_penalty_coefficient=req.army_coeff,
         cavalry_penalty_coefficient=req.cav_coeff,
-        max_iter=100
+        modifiers=modifiers,
+        **options
     )
+    optimize_cache.put(cache_key, result)
     return result
+
+@app.post("/api/v1/sensitivity")
+def level_sensitivity_troops(req: SensitivityRequest):
+    validate_army(req.tribe, req.troops, req.troop_levels, req.max_troop_limit, profile=req.profile)
+    validate_modifiers(req.troops, req.modifiers)
+    validate_time_budget(req.time_budget_ms)
+
+    if not req.oasis_compositions:
+        raise HTTPException(status_code=400, detail="oasis_compositions must not be empty")
+    if len(req.oasis_compositions) > MAX_SENSITIVITY_OASES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SENSITIVITY_OASES} oases per request")
+
+    return level_sensitivity(
+        tribe=req.tribe,
+        troops=req.troops,
+        troop_levels=req.troop_levels,
+        oasis_compositions=req.oasis_compositions,
+        max_troop_limit=req.max_troop_limit,
+        army_size_penalty_coefficient=req.army_coeff,
+        cavalry_penalty_coefficient=req.cav_coeff,
+        profile=req.profile,
+        modifiers=req.modifiers.model_dump() if req.modifiers is not None else None,
+        time_budget_ms=req.time_budget_ms or DEFAULT_SENSITIVITY_BUDGET_MS
+    )
+
+@app.post("/api/v1/plan")
+def plan_raid_troops(req: RaidPlanRequest):
+    validate_troops(req.tribe, req.troops, req.troop_levels, req.profile)
+
+    for troop in req.troops:
+        if troop not in req.available_troops:
+            raise HTTPException(status_code=400, detail=f"available_troops missing entry for '{troop}'")
+        if not 0 <= req.available_troops[troop] <= MAX_TROOP_LIMIT:
+            raise HTTPException(status_code=400, detail=f"available_troops for '{troop}' must be in [0, {MAX_TROOP_LIMIT}]")
+
+    if len(req.oases) > MAX_FARM_LIST_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FARM_LIST_SIZE} oases per plan")
+
+    return plan_raids(
+        tribe=req.tribe,
+        troops=req.troops,
+        troop_levels=req.troop_levels,
+        available_troops=req.available_troops,
+        oases=[oasis.model_dump() for oasis in req.oases],
+        army_size_penalty_coefficient=req.army_coeff,
+        cavalry_penalty_coefficient=req.cav_coeff,
+        profile=req.profile
+    )
+
+@app.post("/api/v1/jobs", status_code=202)
+def submit_optimization_job(req: OptimizationJobRequest):
+    validate_army(req.tribe, req.troops, req.troop_levels, req.max_troop_limit, req.engine, req.profile)
+
+    validate_warm_start(req.troops, req.warm_start)
+    validate_starts(req.starts)
+    validate_time_budget(req.time_budget_ms)
+    validate_modifiers(req.troops, req.modifiers)
+
+    if req.max_iter < 1:
+        raise HTTPException(status_code=400, detail="max_iter must be at least 1")
+
+    try:
+        job_id = jobs.submit(
+            tribe=req.tribe,
+            troops=req.troops,
+            troop_levels=req.troop_levels,
+            oasis_composition=req.oasis_composition,
+            max_troop_limit=req.max_troop_limit,
+            army_size_penalty_coefficient=req.army_coeff,
+            cavalry_penalty_coefficient=req.cav_coeff,
+            max_iter=req.max_iter,
+            engine=req.engine,
+            diagnostics=req.diagnostics,
+            warm_start=req.warm_start,
+            starts=req.starts,
+            time_budget_ms=req.time_budget_ms,
+            profile=req.profile,
+            modifiers=req.modifiers.model_dump() if req.modifiers is not None else None
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+    return jobs.get(job_id)
+
+@app.get("/api/v1/jobs/{job_id}")
+def get_optimization_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.delete("/api/v1/jobs/{job_id}")
+def cancel_optimization_job(job_id: str):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def stream_optimization_job(job_id: str):
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    # Server-sent events: one "data:" line with the job snapshot whenever it changes
+    async def events():
+        last = None
+        while True:
+            job = jobs.get(job_id)
+            if job is None:
+                return
+            if job != last:
+                yield f"data: {json.dumps(job)}\n\n"
+                last = job
+            if job["finished_at"] is not None:
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/api/v1/profiles")
+def server_profiles():
+    return {"default": DEFAULT_PROFILE, "profiles": list_profiles()}
+
+@app.get("/healthz")
+def health():
+    return {"status": "ok", "solver_ready": solver_ready.is_set()}
+
+@app.get("/readyz")
+def readiness():
+    if not solver_ready.is_set():
+        raise HTTPException(status_code=503, detail="Solver is warming up")
+    return {"status": "ready", "warm_up_ms": warm_up_ms}
+
+@app.get("/api/v1/cache/stats")
+def cache_stats():
+    return {**optimize_cache.stats(), "coalescing": optimize_flights.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/v1/evaluate")
+def evaluate_troops(req: EvaluationRequest):
+    validate_troops(req.tribe, req.troops, req.troop_levels, req.profile)
+
+    for army in req.armies:
+        if len(army) != len(req.troops):
+            raise HTTPException(status_code=400, detail=f"Each army must have {len(req.troops)} counts, one per troop")
+
+    scores, loss_percent, troop_losses = loss_function_batch(
+        tribe=req.tribe,
+        troops=req.troops,
+        armies=req.armies,
+        troop_levels=req.troop_levels,
+        oasis_composition=req.oasis_composition,
+        army_size_penalty_coefficient=req.army_coeff,
+        cavalry_penalty_coefficient=req.cav_coeff,
+        max_troop_limit=req.max_troop_limit,
+        profile=req.profile
+    )
+
+    # JSON has no infinity, infeasible armies come back as null
+    return {
+        "objective_scores": [score if math.isfinite(score) else None for score in scores.tolist()],
+        "loss_percent": [loss if math.isfinite(loss) else None for loss in loss_percent.tolist()],
+        "troop_losses": [dict(zip(req.troops, losses)) for losses in troop_losses.tolist()]
+    }
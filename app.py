@@ -1,10 +1,11 @@
 import streamlit as st
-import re
 import json
 
 from login import login_required
-from troops_config import OASIS_DEFENSE,TROOPS_TABLE
-from troops_optimizer import run_simulated_annealing
+from oasis_parser import parse_oasis
+from troops_config import OASIS_DEFENSE, list_profiles, load_profile
+from pareto import pareto_front
+from troops_optimizer import ENGINES, run_simulated_annealing
 
 # Require login
 # login_required()
@@ -12,8 +13,10 @@ from troops_optimizer import run_simulated_annealing
 # Main APP
 st.title("🏹 Travian Troop Optimizer")
 
-tribe = st.selectbox("Select your tribe", list(TROOPS_TABLE.keys()))
-troops = st.multiselect("Select troops", list(TROOPS_TABLE[tribe].keys()))
+profile = st.selectbox("Server profile", [entry["name"] for entry in list_profiles()])
+troops_table = load_profile(profile).troops_table
+tribe = st.selectbox("Select your tribe", list(troops_table.keys()))
+troops = st.multiselect("Select troops", list(troops_table[tribe].keys()))
 
 troop_levels = {}
 max_counts = {}
@@ -37,6 +40,14 @@ with col1:
 with col2:
     cav_coeff = st.slider("Cavalry Penalty Coefficient", 0.0, 5.0, 2.5, 0.1, format="%.1f")
 
+engine = st.selectbox("Solver engine", ENGINES, help="auto: exact for one or two troops, annealing otherwise, annealing: scipy dual_annealing, exact: provable integer optimum, table: precomputed lookup (see lookup_table.py)")
+starts = st.number_input("Annealing starts", min_value=1, max_value=32, value=1,
+                         help="Independent annealing runs in parallel, the best army wins")
+time_budget_ms = st.number_input("Time budget (ms)", min_value=0, max_value=600000, value=0, step=100,
+                                 help="Return the best army found within this time, 0 for no limit")
+incremental = st.checkbox("Incremental re-optimization", value=True,
+                          help="Start from the previous result for the same troops instead of a cold search")
+
 st.markdown("---")
 st.subheader("🐍 Oasis Troops")
 
@@ -51,14 +62,7 @@ with st.expander("📋 Auto Parse Oasis Animal List"):
         oasis_text = st.text_area("Paste from in-game oasis message:")
         parse_submitted = st.form_submit_button("Parse and Run Optimization")
         if parse_submitted:
-            for animal in OASIS_DEFENSE:
-                st.session_state.oasis_composition[animal] = 0  # reset
-            for line in oasis_text.splitlines():
-                for animal in OASIS_DEFENSE:
-                    if animal in line:
-                        match = re.search(r"\b(\d+)\b", line)
-                        if match:
-                            st.session_state.oasis_composition[animal] = int(match.group(1))
+            st.session_state.oasis_composition = parse_oasis(oasis_text)
             run_optimization = True
 
 # Manual Entry
@@ -81,6 +85,12 @@ with st.form("manual_form"):
 
 # Execution
 if run_optimization:
+    # The previous army only carries over while the tribe and troop selection stay the same
+    previous = st.session_state.get("previous_result")
+    warm_start = None
+    if incremental and previous is not None and previous["army"] == (tribe, tuple(troops)):
+        warm_start = previous["best_counts"]
+
     result = run_simulated_annealing(
         tribe=tribe,
         troops=troops,
@@ -89,7 +99,51 @@ if run_optimization:
         max_troop_limit=max_counts,
         army_size_penalty_coefficient=army_coeff,
         cavalry_penalty_coefficient=cav_coeff,
-        max_iter=100
+        max_iter=100,
+        engine=engine,
+        warm_start=warm_start,
+        starts=starts,
+        time_budget_ms=time_budget_ms or None,
+        profile=profile
     )
-    st.success("Optimization complete!")
-    st.json(result)
\ No newline at end of file
+    st.session_state.previous_result = {"army": (tribe, tuple(troops)), "best_counts": result["best_counts"]}
+    st.success("Optimization complete!" if warm_start is None else "Re-optimized from the previous result!")
+    if not result["converged"]:
+        st.warning("The search was not run to completion (time budget or precomputed table), "
+                   "this is the best army found but it may not be optimal.")
+    st.json(result)
+
+# Loss against army size
+with st.expander("📈 Loss vs. army size"):
+    # Everything the front depends on, a front computed for other inputs is not shown
+    pareto_inputs = (profile, tribe, tuple(troops), tuple(sorted(troop_levels.items())),
+                     tuple(sorted(max_counts.items())), tuple(sorted(st.session_state.oasis_composition.items())),
+                     cav_coeff)
+    if st.button("Compute trade-off front"):
+        st.session_state.pareto_inputs = pareto_inputs
+        st.session_state.pareto = pareto_front(
+            tribe=tribe,
+            troops=troops,
+            troop_levels=troop_levels,
+            oasis_composition=st.session_state.oasis_composition.copy(),
+            max_troop_limit=max_counts,
+            cavalry_weight=cav_coeff,
+            profile=profile
+        )
+
+    pareto = st.session_state.get("pareto")
+    if pareto and st.session_state.get("pareto_inputs") != pareto_inputs:
+        st.info("The inputs changed since the front was computed, compute it again.")
+    elif pareto and pareto["front"]:
+        front = pareto["front"]
+        st.line_chart({"army size": [point["army_size"] for point in front],
+                       "resource loss": [point["total_loss_cost"] for point in front]},
+                      x="army size", y="resource loss")
+        index = st.slider("Army along the front", 0, len(front) - 1, len(front) // 2)
+        point = front[index]
+        st.json({
+            "best_counts": dict(zip(pareto["troops"], point["counts"])),
+            "army_size": point["army_size"],
+            "total_loss_cost": point["total_loss_cost"],
+            "loss_percent": point["loss_percent"]
+        })
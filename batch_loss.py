@@ -0,0 +1,150 @@
+from functools import lru_cache
+
+import numpy as np
+
+from troops_config import DEFAULT_PROFILE, compute_oasis_defense, load_profile
+
+# Relative distance from a .5 rounding tie below which a troop loss is recomputed in Python
+TIE_TOLERANCE = 1e-12
+
+@lru_cache(maxsize=256)
+def _troop_vectors(tribe: str, troops: tuple, levels: tuple, profile: str):
+    stats = load_profile(profile)
+    rows = np.array([stats.troop_ids[tribe][troop] for troop in troops], dtype=np.intp)
+    columns = np.array(levels, dtype=np.intp) - 1
+    counts = stats.levels[rows]
+    if ((columns >= counts) | (columns < -counts)).any():
+        raise IndexError(f"Troop level out of range for {tribe} in server profile '{profile}'")
+
+    # Negative columns count from the top level, like indexing the attack lists always did
+    attack = stats.attack[rows, columns % counts]
+    cost = stats.cost[rows]
+    is_cavalry = stats.is_cavalry[rows]
+
+    # Shared between callers through the cache, so keep them immutable
+    for vector in (attack, cost, is_cavalry):
+        vector.setflags(write=False)
+
+    return attack, cost, is_cavalry
+
+def troop_vectors(tribe: str, troops: list, troop_levels: dict, profile: str = DEFAULT_PROFILE):
+    """
+    Resolves per-troop attack, cost and cavalry flag into arrays, cached per (tribe, troops, levels, profile)
+
+    Parameters:
+    - tribe: e.g., "Teuton"
+    - troops: list of troop names, fixes the column order
+    - troop_levels: dict of levels, missing troops default to level 1
+    - profile: server profile name
+
+    Returns (attack, cost, is_cavalry) read-only arrays of length len(troops)
+    """
+
+    levels = tuple(troop_levels.get(troop, 1) for troop in troops)
+    return _troop_vectors(tribe, tuple(troops), levels, profile)
+
+def evaluate_armies(armies,
+                    attack,
+                    cost,
+                    is_cavalry,
+                    inf_def: float,
+                    cav_def: float,
+                    army_size_penalty_coefficient: float,
+                    cavalry_penalty_coefficient: float):
+    """
+    Scores an (N, k) array of integer armies in one NumPy pass.
+    Float operations run in the same order as loss_function, so scores and troop losses match
+    it exactly. loss_percent may differ from count_loss_percentage in the last bit.
+
+    Parameters:
+    - armies: (N, k) integer counts, columns ordered like the troop vectors
+    - attack, cost, is_cavalry: vectors from troop_vectors
+    - inf_def, cav_def: oasis defense from compute_oasis_defense
+    - army_size_penalty_coefficient: penalty per army size
+    - cavalry_penalty_coefficient: penalty per cavalry unit
+
+    Returns (objective_scores, loss_percent, troop_losses)
+    - objective_scores: (N,) float, inf for empty armies
+    - loss_percent: (N,) float, inf for empty armies
+    - troop_losses: (N, k) int, zero for empty armies
+    """
+
+    armies = np.asarray(armies, dtype=float).reshape(-1, len(attack))
+    inf_pow = np.zeros(len(armies))
+    cav_pow = np.zeros(len(armies))
+    army_size_penalty = np.zeros(len(armies))
+
+    # Accumulate in troop order so every float matches the dict path
+    for i in range(armies.shape[1]):
+        if is_cavalry[i]:
+            cav_pow = cav_pow + armies[:, i] * attack[i]
+            army_size_penalty = army_size_penalty + armies[:, i] * cavalry_penalty_coefficient
+        else:
+            inf_pow = inf_pow + armies[:, i] * attack[i]
+            army_size_penalty = army_size_penalty + armies[:, i]
+
+    total_pow = inf_pow + cav_pow
+    empty = total_pow == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inf_pow_ratio = np.where(inf_pow != 0, inf_pow / total_pow, 0.0)
+        cav_pow_ratio = np.where(cav_pow != 0, cav_pow / total_pow, 0.0)
+        effective_defense = inf_def * inf_pow_ratio + cav_def * cav_pow_ratio
+        loss_percent = 100 * (effective_defense / total_pow) ** 1.5
+        unrounded = armies * loss_percent[:, None] / 100
+        near_tie = (np.abs(unrounded - np.floor(unrounded) - 0.5) <= TIE_TOLERANCE * (unrounded + 1)).any(axis=1)
+    troop_losses = np.rint(unrounded)
+
+    # NumPy's SIMD pow may be an ulp away from libm, redo rows sitting on a rounding tie in Python
+    for row in np.flatnonzero(near_tie & ~empty):
+        loss_percent[row] = 100 * (float(effective_defense[row]) / float(total_pow[row])) ** 1.5
+        troop_losses[row] = np.rint(armies[row] * loss_percent[row] / 100)
+
+    loss_percent[empty] = np.inf
+    troop_losses[empty] = 0
+
+    # Losses times cost are whole numbers, so the summation order cannot change the result
+    scores = troop_losses @ np.asarray(cost) + army_size_penalty * army_size_penalty_coefficient
+    scores[empty] = np.inf
+
+    return scores, loss_percent, troop_losses.astype(np.int64)
+
+def loss_function_batch(tribe: str,
+                        troops: list,
+                        armies,
+                        troop_levels: dict,
+                        oasis_composition: dict,
+                        army_size_penalty_coefficient: float = 5.0,
+                        cavalry_penalty_coefficient: float = 2.5,
+                        max_troop_limit: dict = None,
+                        profile: str = DEFAULT_PROFILE):
+    """
+    Batched loss_function over many candidate armies.
+
+    Parameters:
+    - tribe: e.g., "Teuton"
+    - troops: list of troop names, one per column of `armies`
+    - armies: (N, k) integer counts, e.g., [[300, 10], [250, 12]]
+    - troop_levels: dict of levels
+    - oasis_composition: dict of animal name to count, e.g., {"Rat": 12, "Spider": 10}
+    - army_size_penalty_coefficient: penalty per army size
+    - cavalry_penalty_coefficient: penalty per cavalry unit
+    - max_troop_limit: optional upper bound for each troop
+    - profile: server profile name
+
+    Returns (objective_scores, loss_percent, troop_losses), see evaluate_armies
+    """
+
+    attack, cost, is_cavalry = troop_vectors(tribe, troops, troop_levels, profile)
+    inf_def, cav_def = compute_oasis_defense(oasis_composition, profile)
+    armies = np.asarray(armies).reshape(-1, len(troops))
+
+    scores, loss_percent, troop_losses = evaluate_armies(
+        armies, attack, cost, is_cavalry, inf_def, cav_def,
+        army_size_penalty_coefficient, cavalry_penalty_coefficient
+    )
+
+    if max_troop_limit:
+        limits = np.array([max_troop_limit.get(troop, np.inf) for troop in troops], dtype=float)
+        scores[(armies > limits).any(axis=1)] = np.inf # Punish infinitely
+
+    return scores, loss_percent, troop_losses
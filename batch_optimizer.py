@@ -0,0 +1,177 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import worker_pool
+from batch_loss import troop_vectors
+from result_cache import canonical_request_key
+from troops_config import DEFAULT_PROFILE
+from troops_optimizer import run_simulated_annealing
+
+def _optimize_one(args):
+    """Worker entry point, returns (result, elapsed_ms) for one oasis"""
+
+    army, oasis_composition = args
+    start = time.perf_counter()
+    # Troop vectors are cached per process, so only the first oasis a worker sees resolves them
+    troop_vectors(army["tribe"], army["troops"], army["troop_levels"], army["profile"])
+    result = run_simulated_annealing(oasis_composition=oasis_composition, **army)
+    return result, (time.perf_counter() - start) * 1000
+
+# Oases in flight per pool worker while streaming, keeps memory flat for any farm list size
+STREAM_WINDOW_PER_WORKER = 4
+
+def optimize_farm_list(tribe: str,
+                       troops: list,
+                       troop_levels: dict,
+                       oasis_compositions: list,
+                       max_troop_limit: dict,
+                       army_size_penalty_coefficient: float = 3.0,
+                       cavalry_penalty_coefficient: float = 10.0,
+                       max_iter: int = 100,
+                       engine: str = "auto",
+                       cache=None,
+                       profile: str = DEFAULT_PROFILE):
+    """
+    Optimizes one army spec against every oasis of a farm list.
+    Identical oases are solved once and the distinct ones are spread over the process pool.
+
+    Parameters:
+    - tribe, troops, troop_levels, max_troop_limit, coefficients, max_iter, engine, profile: as in run_simulated_annealing
+    - oasis_compositions: list of dicts of animal name to count, one per oasis
+    - cache: optional ResultCache consulted and filled per oasis
+
+    Returns {"results": [...], "total_ms": float}, each item holding the oasis_composition,
+    its run_simulated_annealing result, elapsed_ms spent solving it and whether it was a cache hit
+    """
+
+    start = time.perf_counter()
+    army = {
+        "tribe": tribe,
+        "troops": troops,
+        "troop_levels": troop_levels,
+        "max_troop_limit": max_troop_limit,
+        "army_size_penalty_coefficient": army_size_penalty_coefficient,
+        "cavalry_penalty_coefficient": cavalry_penalty_coefficient,
+        "max_iter": max_iter,
+        "engine": engine,
+        "profile": profile
+    }
+
+    # Step 1: Collapse equivalent oases and serve what the cache already holds
+    options = {"profile": profile}
+    keys = [
+        canonical_request_key(tribe, troops, troop_levels, oasis, max_troop_limit,
+                              army_size_penalty_coefficient, cavalry_penalty_coefficient, engine, options)
+        for oasis in oasis_compositions
+    ]
+    solved = {}
+    pending = {}
+    for key, oasis in zip(keys, oasis_compositions):
+        if key in solved or key in pending:
+            continue
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            solved[key] = (cached, 0.0, True)
+        else:
+            pending[key] = oasis
+
+    # Step 2: Solve the rest, in-process when there is nothing to spread
+    tasks = [(army, oasis) for oasis in pending.values()]
+    if len(tasks) == 1 or worker_pool.MAX_WORKERS == 1:
+        outcomes = map(_optimize_one, tasks)
+    else:
+        outcomes = worker_pool.get_pool().map(_optimize_one, tasks, chunksize=worker_pool.chunksize_for(len(tasks)))
+
+    for key, (result, elapsed_ms) in zip(list(pending), outcomes):
+        solved[key] = (result, elapsed_ms, False)
+        if cache is not None:
+            cache.put(key, result)
+
+    results = []
+    for key, oasis in zip(keys, oasis_compositions):
+        result, elapsed_ms, cached = solved[key]
+        results.append({
+            "oasis_composition": oasis,
+            "result": result,
+            "elapsed_ms": elapsed_ms,
+            "cached": cached
+        })
+
+    return {"results": results, "total_ms": (time.perf_counter() - start) * 1000}
+
+def iter_farm_list(tribe: str,
+                   troops: list,
+                   troop_levels: dict,
+                   oasis_compositions,
+                   max_troop_limit: dict,
+                   army_size_penalty_coefficient: float = 3.0,
+                   cavalry_penalty_coefficient: float = 10.0,
+                   max_iter: int = 100,
+                   engine: str = "auto",
+                   cache=None,
+                   profile: str = DEFAULT_PROFILE):
+    """
+    optimize_farm_list as a generator, for farm lists too large to answer in one piece.
+    Oases are read lazily and at most STREAM_WINDOW_PER_WORKER per worker are in flight,
+    each result is yielded as soon as it is solved. Copies of an oasis still in flight wait
+    for it, later copies are served by the cache.
+
+    Parameters: as in optimize_farm_list, oasis_compositions may be any iterable
+
+    Yields {"index", "oasis_composition", "result", "elapsed_ms", "cached"} in completion
+    order, index being the oasis' position in oasis_compositions
+    """
+
+    army = {
+        "tribe": tribe,
+        "troops": troops,
+        "troop_levels": troop_levels,
+        "max_troop_limit": max_troop_limit,
+        "army_size_penalty_coefficient": army_size_penalty_coefficient,
+        "cavalry_penalty_coefficient": cavalry_penalty_coefficient,
+        "max_iter": max_iter,
+        "engine": engine,
+        "profile": profile
+    }
+    options = {"profile": profile}
+    waiting = {}
+    in_flight = {}
+    pool = worker_pool.get_pool() if worker_pool.MAX_WORKERS > 1 else None
+    window = STREAM_WINDOW_PER_WORKER * worker_pool.MAX_WORKERS
+
+    def solved(key, result, elapsed_ms):
+        if cache is not None:
+            cache.put(key, result)
+        for index, oasis in waiting.pop(key):
+            yield {"index": index, "oasis_composition": oasis, "result": result, "elapsed_ms": elapsed_ms, "cached": False}
+
+    def drain(limit):
+        while len(in_flight) > limit:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from solved(in_flight.pop(future), *future.result())
+
+    try:
+        for index, oasis in enumerate(oasis_compositions):
+            key = canonical_request_key(tribe, troops, troop_levels, oasis, max_troop_limit,
+                                        army_size_penalty_coefficient, cavalry_penalty_coefficient, engine, options)
+            if key in waiting:
+                waiting[key].append((index, oasis))
+                continue
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                yield {"index": index, "oasis_composition": oasis, "result": cached, "elapsed_ms": 0.0, "cached": True}
+                continue
+
+            waiting[key] = [(index, oasis)]
+            if pool is None:
+                yield from solved(key, *_optimize_one((army, oasis)))
+                continue
+            in_flight[pool.submit(_optimize_one, (army, oasis))] = key
+            yield from drain(window - 1)
+
+        yield from drain(0)
+    finally:
+        # The consumer went away, drop what has not started
+        for future in in_flight:
+            future.cancel()
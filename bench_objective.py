@@ -0,0 +1,83 @@
+"""
+Per-evaluation cost of the annealing objective: the dict path (loss_function_vectorized)
+against the compiled problem (CompiledProblem.objective) and its batched form.
+
+Usage: python bench_objective.py [evaluations]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from problem import compile_problem
+from troops_optimizer import loss_function_vectorized
+
+CASES = [
+    {
+        "tribe": "Teuton",
+        "troops": ["Clubswinger", "Teutonic_Knight"],
+        "troop_levels": {"Clubswinger": 13, "Teutonic_Knight": 12},
+        "max_troop_limit": {"Clubswinger": 500, "Teutonic_Knight": 20},
+        "oasis_composition": {"Rat": 22, "Spider": 4}
+    },
+    {
+        "tribe": "Roman",
+        "troops": ["Legionnaire", "Imperian", "Equites_Imperatoris", "Equites_Caesaris"],
+        "troop_levels": {"Legionnaire": 10, "Imperian": 10, "Equites_Imperatoris": 10, "Equites_Caesaris": 10},
+        "max_troop_limit": {"Legionnaire": 2000, "Imperian": 2000, "Equites_Imperatoris": 1000, "Equites_Caesaris": 1000},
+        "oasis_composition": {"Bear": 5, "Crocodile": 3, "Tiger": 4, "Elephant": 2}
+    }
+]
+
+ARMY_COEFF = 5.0
+CAV_COEFF = 2.5
+
+def time_per_call(func, samples):
+    start = time.perf_counter()
+    for x in samples:
+        func(x)
+    return (time.perf_counter() - start) / len(samples)
+
+def bench_case(case, evaluations, rng):
+    troops = case["troops"]
+    caps = np.array([case["max_troop_limit"][troop] for troop in troops])
+    samples = rng.uniform(0, caps, size=(evaluations, len(troops)))
+
+    def dict_path(x):
+        return loss_function_vectorized(
+            x, case["tribe"], troops, case["troop_levels"], case["oasis_composition"],
+            ARMY_COEFF, CAV_COEFF, case["max_troop_limit"]
+        )
+
+    problem = compile_problem(
+        case["tribe"], troops, case["troop_levels"], case["oasis_composition"],
+        case["max_troop_limit"], ARMY_COEFF, CAV_COEFF
+    )
+
+    for x in samples[:1000]:
+        assert dict_path(x) == problem.objective(x), "compiled objective diverged from loss_function"
+
+    dict_time = time_per_call(dict_path, samples)
+    compiled_time = time_per_call(problem.objective, samples)
+
+    armies = np.rint(samples).astype(np.int64)
+    start = time.perf_counter()
+    problem.evaluate(armies)
+    batch_time = (time.perf_counter() - start) / evaluations
+
+    return dict_time, compiled_time, batch_time
+
+def main():
+    evaluations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = np.random.default_rng(42)
+
+    print(f"{'case':<40} {'dict ns':>10} {'compiled ns':>12} {'batch ns':>10} {'speedup':>8}")
+    for case in CASES:
+        dict_time, compiled_time, batch_time = bench_case(case, evaluations, rng)
+        name = f"{case['tribe']} x{len(case['troops'])}"
+        print(f"{name:<40} {dict_time * 1e9:>10.0f} {compiled_time * 1e9:>12.0f} "
+              f"{batch_time * 1e9:>10.1f} {dict_time / compiled_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
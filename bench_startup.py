@@ -0,0 +1,84 @@
+"""
+Cold start of the API process: import time of api.py, then with uvicorn as the Procfile runs
+it, the time until /healthz answers, until /readyz reports the warmed-up solvers, and the
+latency of the first optimization request.
+
+Usage: python bench_startup.py [runs] [port]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+REQUEST = {
+    "tribe": "Teuton",
+    "troops": ["Clubswinger", "Axeman", "Teutonic_Knight"],
+    "troop_levels": {"Clubswinger": 10, "Axeman": 10, "Teutonic_Knight": 10},
+    "oasis_composition": {"Rat": 20, "Snake": 10, "Boar": 6, "Wolf": 4},
+    "max_troop_limit": {"Clubswinger": 500, "Axeman": 200, "Teutonic_Knight": 100},
+    "army_coeff": 3.0,
+    "cav_coeff": 10.0
+}
+
+# Polling interval while waiting for the server, in seconds
+POLL_INTERVAL = 0.01
+
+def import_ms():
+    code = "import time; start = time.perf_counter(); import api; print((time.perf_counter() - start) * 1000)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def wait_for(url, start, timeout=60.0):
+    """Milliseconds from start until url answers 200"""
+
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url) as response:
+                if response.status == 200:
+                    return (time.perf_counter() - start) * 1000
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(POLL_INTERVAL)
+    raise TimeoutError(f"{url} did not answer within {timeout} s")
+
+def first_request_ms(base):
+    request = urllib.request.Request(base + "/api/v1/optimize", data=json.dumps(REQUEST).encode(),
+                                     headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+def bench_server(port):
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        healthy = wait_for(base + "/healthz", start)
+        ready = wait_for(base + "/readyz", start)
+        first = first_request_ms(base)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"healthy_ms": healthy, "ready_ms": ready, "first_request_ms": first}
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+
+    samples = {"import_ms": [import_ms() for _ in range(runs)]}
+    for _ in range(runs):
+        for name, value in bench_server(port).items():
+            samples.setdefault(name, []).append(value)
+
+    for name, values in samples.items():
+        print(f"{name:>18}: median {statistics.median(values):8.1f} ms, max {max(values):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
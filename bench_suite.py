@@ -0,0 +1,182 @@
+"""
+Benchmark suite: loss kernel throughput, optimizer wall time and evaluations, and solution
+quality against a brute-force optimum, over a matrix of tribes, troop sets and oasis sizes.
+Writes one JSON document so runs of different versions can be diffed.
+
+Usage: python bench_suite.py [--quick] [--output results.json]
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import scipy
+
+import troops_optimizer
+from troops_config import compute_offense_split
+from troops_optimizer import count_loss_percentage, loss_function, run_simulated_annealing
+
+TROOP_SETS = {
+    "Teuton": [["Clubswinger"], ["Clubswinger", "Teutonic_Knight"], ["Clubswinger", "Axeman", "Teutonic_Knight"]],
+    "Roman": [["Legionnaire"], ["Legionnaire", "Equites_Imperatoris"],
+              ["Legionnaire", "Imperian", "Equites_Imperatoris", "Equites_Caesaris"]],
+    "Gaul": [["Swordman"], ["Swordman", "Theutates_Thunder"]]
+}
+
+OASES = {
+    "small": {"Rat": 8, "Spider": 5},
+    "medium": {"Rat": 20, "Snake": 10, "Boar": 6, "Wolf": 4},
+    "large": {"Bear": 12, "Crocodile": 6, "Tiger": 8, "Elephant": 4}
+}
+
+LEVEL = 10
+ARMY_COEFF = 3.0
+CAV_COEFF = 10.0
+
+# Per-troop cap of the optimizer runs
+OPTIMIZE_CAP = 1000
+
+# Per-troop cap of the brute-force quality runs, by troop count, small enough to enumerate
+BRUTE_FORCE_CAPS = {1: 2000, 2: 150, 3: 40, 4: 14}
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def cases(quick):
+    for tribe, troop_sets in TROOP_SETS.items():
+        for troops in troop_sets[:2] if quick else troop_sets:
+            for oasis_name, oasis in OASES.items():
+                yield tribe, troops, oasis_name, oasis
+
+def ns_per_call(func, samples):
+    start = time.perf_counter()
+    for sample in samples:
+        func(sample)
+    return (time.perf_counter() - start) / len(samples) * 1e9
+
+def bench_kernels(tribe, troops, oasis_name, oasis, calls, rng):
+    levels = {troop: LEVEL for troop in troops}
+    armies = [dict(zip(troops, (int(count) for count in row)))
+              for row in rng.integers(1, OPTIMIZE_CAP, size=(calls, len(troops)))]
+
+    kernels = {
+        "loss_function": lambda counts: loss_function(tribe, counts, levels, oasis, ARMY_COEFF, CAV_COEFF),
+        "compute_offense_split": lambda counts: compute_offense_split(tribe, levels, counts),
+        "count_loss_percentage": lambda counts: count_loss_percentage(tribe, counts, levels, oasis)
+    }
+    return [
+        {"function": name, "tribe": tribe, "troops": troops, "oasis": oasis_name,
+         "ns_per_call": ns_per_call(kernel, armies)}
+        for name, kernel in kernels.items()
+    ]
+
+def bench_optimizer(tribe, troops, oasis_name, oasis, engines, repeats):
+    levels = {troop: LEVEL for troop in troops}
+    limits = {troop: OPTIMIZE_CAP for troop in troops}
+    rows = []
+    for engine in engines:
+        # Exact searches over 3+ troops with caps in the thousands run for many seconds
+        if engine == "exact" and len(troops) > 2:
+            continue
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = run_simulated_annealing(tribe, troops, levels, oasis, limits, ARMY_COEFF, CAV_COEFF,
+                                             engine=engine, diagnostics=True)
+            times.append((time.perf_counter() - start) * 1000)
+        rows.append({
+            "tribe": tribe, "troops": troops, "oasis": oasis_name, "engine": engine,
+            "engine_ran": result["diagnostics"]["engine"],
+            "wall_ms": float(np.median(times)), "wall_ms_min": min(times),
+            "nfev": result["diagnostics"]["nfev"],
+            "search_ms": result["diagnostics"]["phases_ms"]["search"],
+            "objective_score": result["objective_score"]
+        })
+    return rows
+
+def brute_force(tribe, troops, levels, oasis, limits):
+    """Optimum of loss_function over the whole lattice, lexicographically smallest on ties"""
+
+    best_counts, best_score = None, float("inf")
+    for counts in itertools.product(*(range(limits[troop] + 1) for troop in troops)):
+        score = loss_function(tribe, dict(zip(troops, counts)), levels, oasis, ARMY_COEFF, CAV_COEFF, limits)
+        if score < best_score:
+            best_counts, best_score = dict(zip(troops, counts)), score
+    return best_counts, best_score
+
+def bench_quality(tribe, troops, oasis_name, oasis, engines):
+    levels = {troop: LEVEL for troop in troops}
+    limits = {troop: BRUTE_FORCE_CAPS[len(troops)] for troop in troops}
+    optimum_counts, optimum = brute_force(tribe, troops, levels, oasis, limits)
+    rows = []
+    for engine in engines:
+        result = run_simulated_annealing(tribe, troops, levels, oasis, limits, ARMY_COEFF, CAV_COEFF,
+                                         engine=engine, diagnostics=True)
+        rows.append({
+            "tribe": tribe, "troops": troops, "oasis": oasis_name, "engine": engine,
+            "engine_ran": result["diagnostics"]["engine"],
+            "cap": limits[troops[0]],
+            "objective_score": result["objective_score"],
+            "optimum": optimum, "optimum_counts": optimum_counts,
+            "gap": result["objective_score"] - optimum,
+            "optimal": result["objective_score"] == optimum
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimizer and loss kernel benchmarks")
+    parser.add_argument("--quick", action="store_true", help="fewer troop sets, calls and repeats")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--engines", nargs="+", default=["annealing", "exact"], choices=troops_optimizer.ENGINES)
+    args = parser.parse_args()
+
+    calls, repeats = (2000, 1) if args.quick else (20000, 3)
+    rng = np.random.default_rng(42)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "machine": platform.machine(),
+            "quick": args.quick
+        },
+        "kernels": [],
+        "optimizer": [],
+        "quality": []
+    }
+
+    for tribe, troops, oasis_name, oasis in cases(args.quick):
+        print(f"{tribe} {'+'.join(troops)} {oasis_name}", file=sys.stderr)
+        report["kernels"].extend(bench_kernels(tribe, troops, oasis_name, oasis, calls, rng))
+        report["optimizer"].extend(bench_optimizer(tribe, troops, oasis_name, oasis, args.engines, repeats))
+        report["quality"].extend(bench_quality(tribe, troops, oasis_name, oasis, args.engines))
+
+    quality = report["quality"]
+    report["summary"] = {
+        engine: {
+            "optimal": sum(row["optimal"] for row in quality if row["engine"] == engine),
+            "cases": sum(row["engine"] == engine for row in quality),
+            "max_gap": max((row["gap"] for row in quality if row["engine"] == engine), default=None)
+        }
+        for engine in args.engines
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import time
+
+import numpy as np
+
+from analytic_solver import solve_single_troop
+from problem import compile_problem
+from troops_config import DEFAULT_PROFILE
+
+# Number of candidate armies expanded and scored per NumPy call
+CHUNK_SIZE = 1 << 18
+
+# Number of partial armies bounded per NumPy call
+NODE_CHUNK = 1 << 12
+
+# Slices of the remaining power each partial army is bounded over
+SLICES = 128
+
+# Rows scored and partial armies bounded between two clock checks when the search has a deadline
+# or a should_stop poll
+DEADLINE_CHUNK = 1 << 14
+DEADLINE_NODE_CHUNK = 1 << 8
+
+# Relative slack applied to lower bounds so float rounding can never prune the optimum
+BOUND_TOLERANCE = 1e-9
+
+def solve_exact(tribe: str,
+                troops: list,
+                troop_levels: dict,
+                oasis_composition: dict,
+                max_troop_limit: dict,
+                army_size_penalty_coefficient: float = 3.0,
+                cavalry_penalty_coefficient: float = 10.0,
+                callback=None,
+                stats: dict = None,
+                deadline: float = None,
+                profile: str = DEFAULT_PROFILE,
+                modifiers: dict = None):
+    """
+    Exact branch-and-bound search over the integer lattice [0, max_troop_limit]
+
+    Troops are fixed one at a time and every partial army is bounded from below by a
+    relaxation of loss_function that uses its monotonic structure:
+    - for a fixed defense mix the loss percentage falls as total power P rises, and it is
+      never below 100 * (d_min / P) ** 1.5 where d_min is the weakest defense the army can face
+    - rounding is monotone, so fixed troops keep their exact rounded losses at that floor
+    - the troops not fixed yet are relaxed to a fractional knapsack for the missing power,
+      with round(n * x) >= n * x - 0.5 so "rounded to zero losses" armies stay inside the bound
+
+    Total power is split into geometric slices, only the slices whose bound can still beat
+    the incumbent are expanded, and children are sliced again inside that band. Complete
+    armies are scored in NumPy chunks. Ties are broken towards the lexicographically
+    smallest army in `troops` order.
+
+    Cost grows with how flat the objective is around the optimum: 2-troop searches and
+    3-troop searches with caps in the hundreds take milliseconds, 3-4 troop searches with
+    caps in the thousands can take seconds.
+
+    Parameters:
+    - tribe: e.g., "Teuton"
+    - troops: list of troop names
+    - troop_levels: dict of levels
+    - oasis_composition: dict of animal name to count, e.g., {"Rat": 12, "Spider": 10}
+    - max_troop_limit: upper bound for each troop
+    - army_size_penalty_coefficient: penalty per army size
+    - cavalry_penalty_coefficient: penalty per cavalry unit
+    - callback: optional callback(best_counts, best_score) run on every new incumbent,
+      returning True stops the search and keeps the incumbent
+    - stats: optional dict filled with "evaluations" (complete armies scored), "infeasible"
+      (those scoring inf), "nodes" (partial armies bounded) and "stopped" (the callback or
+      the deadline ended the search before it proved the incumbent optimal)
+    - deadline: optional time.monotonic() value after which the search stops with the
+      incumbent, which is feasible as soon as the single-troop armies of step 1 are scored
+    - profile: server profile name of the troop and animal stats
+    - modifiers: optional attack bonuses, see modifiers.apply_modifiers
+
+    Returns (best_counts, best_score)
+    """
+
+    problem = compile_problem(tribe, troops, troop_levels, oasis_composition, max_troop_limit,
+                              army_size_penalty_coefficient, cavalry_penalty_coefficient, profile, modifiers)
+    return solve_problem(problem, callback, stats, deadline)
+
+def solve_problem(problem, callback=None, stats: dict = None, deadline: float = None, seeds=None,
+                  should_stop=None):
+    """
+    solve_exact on an already compiled problem, its limits are the search caps and must be finite.
+    One-troop problems take the closed form of analytic_solver.solve_single_troop.
+    seeds: optional (M, k) armies scored into the incumbent first, e.g. optima of similar
+    problems; a tight start prunes more and never changes the result
+    should_stop: optional no-argument callable polled with the deadline, returning True stops
+    the search like the deadline does
+
+    Returns (best_counts, best_score)
+    """
+
+    if len(problem.troops) == 1:
+        stats = {} if stats is None else stats
+        best_counts, best_score = solve_single_troop(problem, stats)
+        if callback is not None and np.isfinite(best_score):
+            callback(best_counts, best_score)
+        stats.update(nodes=0, stopped=False)
+        return best_counts, best_score
+
+    troops = problem.troops
+    attack, is_cavalry, inf_def, cav_def = problem.attack, problem.is_cavalry, problem.inf_def, problem.cav_def
+    caps = np.array([max(0, int(limit)) for limit in problem.limits])
+    weights = problem.army_size_penalty_coefficient * np.where(is_cavalry, problem.cavalry_penalty_coefficient, 1.0)
+    k = len(troops)
+
+    best = {"score": np.inf, "counts": (0,) * k, "stopped": False}
+    if stats is None:
+        stats = {}
+    stats.update(evaluations=0, infeasible=0, nodes=0)
+
+    polled = deadline is not None or should_stop is not None
+
+    def interrupted():
+        return (deadline is not None and time.monotonic() > deadline) or (should_stop is not None and should_stop())
+
+    def consider(armies):
+        if not polled:
+            return consider_block(armies)
+        for first in range(0, len(armies), DEADLINE_CHUNK):
+            if best["stopped"] and np.isfinite(best["score"]):
+                return
+            consider_block(armies[first:first + DEADLINE_CHUNK])
+
+    def consider_block(armies):
+        scores, _, _ = problem.evaluate(armies)
+        stats["evaluations"] += len(armies)
+        stats["infeasible"] += int(np.isinf(scores).sum())
+        if polled and interrupted():
+            best["stopped"] = True
+        low = scores.min()
+        if low > best["score"]:
+            return
+        ties = armies[scores == low]
+        candidate = tuple(int(count) for count in ties[np.lexsort(ties.T[::-1])[0]])
+        if low < best["score"] or candidate < best["counts"]:
+            best["score"], best["counts"] = float(low), candidate
+            if callback is not None and callback(dict(zip(troops, candidate)), best["score"]):
+                best["stopped"] = True
+
+    # Step 1: Incumbent from the seeds and single-troop armies
+    if seeds is not None and len(seeds):
+        consider(np.minimum(np.asarray(seeds, dtype=np.int64).reshape(-1, k), caps))
+    for i in range(k):
+        armies = np.zeros((caps[i] + 1, k), dtype=np.int64)
+        armies[:, i] = np.arange(caps[i] + 1)
+        consider(armies)
+
+    if k == 1 or not np.isfinite(best["score"]) or best["stopped"]:
+        stats["stopped"] = best["stopped"]
+        return dict(zip(troops, best["counts"])), best["score"]
+
+    # Step 2: Polish the incumbent with exact single-troop moves so pruning starts tight
+    improved = True
+    while improved and not best["stopped"]:
+        improved = False
+        for i in range(k):
+            current = best["score"]
+            armies = np.tile(best["counts"], (caps[i] + 1, 1))
+            armies[:, i] = np.arange(caps[i] + 1)
+            consider(armies)
+            improved = improved or best["score"] < current
+
+    # Step 3: Branch and bound, strongest troops first since each unit moves the power most
+    order = np.argsort(-attack, kind="stable")
+    a, c, w, cap = attack[order], problem.cost[order], weights[order], caps[order]
+    defense = np.where(is_cavalry, cav_def, inf_def)[order]
+    rest_defense = np.minimum.accumulate(defense[::-1])[::-1]
+    tail_power = np.append(np.cumsum((a * cap)[::-1])[::-1], 0.0)
+
+    def bound_slices(nodes, m, band_low, band_high):
+        """
+        Lower bounds (M, SLICES) for prefixes of length m whose total power must stay in
+        [band_low, band_high], one per slice of that band
+        """
+
+        # Slices are geometric in total power since the loss ratio scales with its 1.5 power
+        fixed_power = nodes @ a[:m]
+        start = np.maximum(np.where(fixed_power > 0, fixed_power, a[m:].min()), band_low)
+        stop = np.minimum(fixed_power + tail_power[m], band_high)
+        reachable = stop >= start
+        stop = np.maximum(stop, start)
+        steps = np.arange(SLICES + 1) / SLICES
+        edges = start[:, None] * (stop / start)[:, None] ** steps
+        edges[:, 0], edges[:, -1] = start, stop
+        bottom_power, top_power = edges[:, :-1], edges[:, 1:]
+        needed = np.maximum(bottom_power - fixed_power[:, None], 0.0)
+
+        # Loss ratio is (inf_def * I + cav_def * C) ** 1.5 / P ** 3, free troops face the weakest defense
+        weighted_defense = (nodes @ (a[:m] * defense[:m]))[:, None] + rest_defense[m] * needed
+        ratio = (np.maximum(weighted_defense / top_power, defense.min()) / top_power) ** 1.5
+
+        # Rounding is monotone, so the fixed troops keep their exact rounded losses at the lowest ratio
+        fixed_losses = np.rint(nodes[:, None, :] * ratio[:, :, None] * (1 - BOUND_TOLERANCE)) @ c[:m]
+        total = fixed_losses + (nodes @ w[:m])[:, None]
+
+        # Fractional knapsack over the free troops: first the units whose losses round to zero
+        ratio = ratio[:, :, None]
+        with np.errstate(divide="ignore"):
+            free_units = np.minimum(cap[m:], 0.5 / ratio)
+        power = np.concatenate([a[m:] * free_units, a[m:] * (cap[m:] - free_units)], axis=2)
+        rate = np.concatenate([np.broadcast_to(w[m:] / a[m:], free_units.shape),
+                               (w[m:] + c[m:] * ratio) / a[m:]], axis=2)
+        if k - m > 1:
+            by_rate = np.argsort(rate, axis=2)
+            power = np.take_along_axis(power, by_rate, axis=2)
+            rate = np.take_along_axis(rate, by_rate, axis=2)
+        taken = np.clip(needed[:, :, None] - (np.cumsum(power, axis=2) - power), 0.0, power)
+        taken = np.where(rate < 0, power, taken)
+        total = total + (taken * rate).sum(axis=2)
+
+        total = total - BOUND_TOLERANCE * (np.abs(total) + 1)
+        return np.where(reachable[:, None], total, np.inf), edges
+
+    def expand(nodes, low, high):
+        """Appends every count in [low, high] to each node, yielding blocks of at most CHUNK_SIZE rows"""
+
+        sizes = np.maximum(high - low + 1, 0)
+        ends = np.cumsum(sizes)
+        first = 0
+        while first < len(nodes):
+            offset = ends[first] - sizes[first]
+            last = max(first + 1, int(np.searchsorted(ends, offset + CHUNK_SIZE, "right")))
+            parents = np.repeat(np.arange(first, last), sizes[first:last])
+            steps = np.arange(len(parents)) - np.repeat(ends[first:last] - sizes[first:last] - offset, sizes[first:last])
+            if len(parents):
+                yield parents, np.column_stack([nodes[parents], low[parents] + steps])
+            first = last
+
+    def count_range(nodes, band_low, band_high):
+        """Counts of the next troop that can keep the total power of `nodes` in [band_low, band_high]"""
+
+        m = nodes.shape[1]
+        fixed_power = nodes @ a[:m]
+        low = np.maximum(0, np.floor((band_low - fixed_power - tail_power[m + 1]) / a[m]))
+        high = np.minimum(cap[m], np.ceil((band_high - fixed_power) / a[m]))
+        return low.astype(np.int64), high.astype(np.int64)
+
+    def score(nodes):
+        armies = np.empty_like(nodes)
+        armies[:, order] = nodes
+        consider(armies)
+
+    node_chunk = NODE_CHUNK if not polled else DEADLINE_NODE_CHUNK
+
+    def descend(nodes, band_low, band_high):
+        m = nodes.shape[1]
+        for start in range(0, len(nodes), node_chunk):
+            if polled and interrupted():
+                best["stopped"] = True
+            if best["stopped"]:
+                return
+            chunk = nodes[start:start + node_chunk]
+            stats["nodes"] += len(chunk)
+            bounds, edges = bound_slices(chunk, m, band_low[start:start + node_chunk], band_high[start:start + node_chunk])
+            viable = bounds <= best["score"]
+            alive = viable.any(axis=1)
+            if not alive.any():
+                continue
+
+            chunk, viable, edges = chunk[alive], viable[alive], edges[alive]
+            rows = np.arange(len(chunk))
+            chunk_low = edges[rows, viable.argmax(axis=1)]
+            chunk_high = edges[rows, SLICES - viable[:, ::-1].argmax(axis=1)]
+
+            low, high = count_range(chunk, chunk_low, chunk_high)
+            for parents, children in expand(chunk, low, high):
+                if best["stopped"]:
+                    return
+                if m + 1 == k:
+                    score(children)
+                    continue
+
+                # A narrow last troop is cheaper to score than to bound
+                last_low, last_high = count_range(children, chunk_low[parents], chunk_high[parents])
+                if m + 2 < k or np.mean(last_high - last_low) > SLICES:
+                    descend(children, chunk_low[parents], chunk_high[parents])
+                    continue
+
+                for _, armies in expand(children, last_low, last_high):
+                    score(armies)
+
+    descend(np.zeros((1, 0), dtype=np.int64), np.zeros(1), np.full(1, tail_power[0]))
+
+    stats["stopped"] = best["stopped"]
+    return dict(zip(troops, best["counts"])), best["score"]
@@ -0,0 +1,187 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from troops_optimizer import run_simulated_annealing
+
+# Worker processes running optimization jobs, kept apart from the shared pool so long jobs
+# never hold up batch requests
+MAX_JOB_WORKERS = 2
+
+# Jobs queued or running at once, submissions beyond it are refused
+MAX_PENDING_JOBS = 32
+
+# Seconds a finished job stays available for polling
+JOB_RETENTION_SECONDS = 3600
+
+# Seconds between two looks at the shared cancelled set from a running job, each look is a
+# round trip to the manager process and the search polls before every evaluation
+CANCEL_POLL_SECONDS = 0.05
+
+class QueueFullError(Exception):
+    pass
+
+def _run_job(job_id, kwargs, events, cancelled):
+    """
+    Worker entry point, reports start and every better army through `events` and stops
+    within CANCEL_POLL_SECONDS of the job id entering `cancelled`
+    """
+
+    # Cancelled while queued, the job record is already final
+    if job_id in cancelled:
+        return None
+
+    events.put((job_id, "running", None))
+    poll = {"at": 0.0, "cancelled": False}
+
+    def on_progress(best_counts, best_score):
+        events.put((job_id, "progress", (best_counts, float(best_score))))
+        return job_id in cancelled
+
+    def should_stop():
+        now = time.monotonic()
+        if now - poll["at"] >= CANCEL_POLL_SECONDS:
+            poll["at"], poll["cancelled"] = now, job_id in cancelled
+        return poll["cancelled"]
+
+    return run_simulated_annealing(**kwargs, callback=on_progress, should_stop=should_stop)
+
+class JobQueue:
+    """
+    Runs run_simulated_annealing jobs in a bounded process pool.
+
+    Workers stream progress through a manager queue that a listener thread folds into the
+    job records, and poll a shared set of cancelled ids during the search so running jobs
+    stop within CANCEL_POLL_SECONDS of a cancel. Everything is created on the first submission.
+    """
+
+    def __init__(self, max_workers: int = MAX_JOB_WORKERS, max_pending: int = MAX_PENDING_JOBS):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _start(self):
+        self._manager = multiprocessing.Manager()
+        self._events = self._manager.Queue()
+        self._cancelled = self._manager.dict()
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                job_id, kind, payload = self._events.get()
+            except (EOFError, OSError):
+                return # Manager shut down with the process
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if kind == "running" and job["status"] == "queued":
+                    job["status"], job["started_at"] = "running", time.time()
+                elif kind == "progress":
+                    job["progress"] = {
+                        "best_counts": payload[0],
+                        "objective_score": payload[1],
+                        "updates": job["progress"]["updates"] + 1 if job["progress"] else 1
+                    }
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                # Jobs cancelled while queued finished at the cancel
+                job["finished_at"] = job["finished_at"] or time.time()
+                if future.cancelled():
+                    job["status"] = "cancelled"
+                elif future.exception() is not None:
+                    job["status"], job["error"] = "failed", str(future.exception())
+                else:
+                    # None when the worker only picked the job up after its cancel
+                    if future.result() is not None:
+                        job["result"] = future.result()
+                    job["status"] = "cancelled" if job["cancel_requested"] else "done"
+        self._cancelled.pop(job_id, None)
+
+    def _prune(self, now):
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] and now - job["finished_at"] > JOB_RETENTION_SECONDS]:
+            del self._jobs[job_id]
+
+    def submit(self, **kwargs):
+        """
+        Queues run_simulated_annealing(**kwargs)
+
+        Returns the job id, raises QueueFullError when MAX_PENDING_JOBS are queued or running
+        """
+
+        with self._lock:
+            if self._pool is None:
+                self._start()
+
+            now = time.time()
+            self._prune(now)
+            pending = sum(job["finished_at"] is None for job in self._jobs.values())
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs already queued or running")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "submitted_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "cancel_requested": False,
+                "progress": None,
+                "result": None,
+                "error": None
+            }
+            future = self._pool.submit(_run_job, job_id, kwargs, self._events, self._cancelled)
+            self._jobs[job_id]["future"] = future
+
+        # Outside the lock, the callback runs right away when the job already finished
+        future.add_done_callback(lambda future: self._finish(job_id, future))
+        return job_id
+
+    def get(self, job_id):
+        """Returns a snapshot of the job, or None when unknown or expired"""
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {key: value for key, value in job.items() if key != "future"}
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job at once, also one the pool already handed to a worker: it is
+        marked cancelled and finished here and its worker returns as soon as it picks it up.
+        A running one stops within CANCEL_POLL_SECONDS and keeps its best army as result.
+
+        Returns the job snapshot, or None when unknown
+        """
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["finished_at"] is None:
+                job["cancel_requested"] = True
+                self._cancelled[job_id] = True
+                if job["status"] == "queued":
+                    job["status"], job["finished_at"] = "cancelled", time.time()
+            future = job.get("future")
+
+        if future is not None:
+            future.cancel()
+        return self.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed", "cancelled")}
@@ -0,0 +1,303 @@
+"""
+Precomputed optimal armies over a grid of oasis defenses.
+
+For a fixed army configuration (tribe, troops, levels, caps, coefficients) the best army
+depends on the oasis only through (inf_def, cav_def) from compute_oasis_defense. A table
+stores the exact optimum for a grid of those pairs, requests are answered from the nearest
+grid armies plus a local integer refinement at the real defense.
+
+Usage: python lookup_table.py config.json [config.json ...]
+where each config holds tribe, troops, troop_levels, max_troop_limit, army_coeff and cav_coeff
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+import worker_pool
+from exact_solver import solve_problem
+from problem import compile_problem
+from troops_config import DEFAULT_PROFILE, load_profile
+
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tables")
+
+# Infantry defense grid, geometric since the loss ratio scales with a power of it
+INF_DEF_AXIS = np.geomspace(10, 50000, 72)
+
+# cav_def / inf_def grid, every animal lies between Boar (0.47) and Snake (1.5)
+DEFENSE_RATIO_AXIS = np.linspace(0.4, 1.6, 13)
+
+# Grid cells taken as seeds on each side of the oasis defense, optima jump between cells
+SEED_REACH = 1
+
+# Half-width of the two-troop neighbourhood scanned around each grid army
+REFINE_WINDOW = 6
+
+# Reach of the single-troop moves tried around each seed
+REFINE_REACH = 50
+
+# Shorter reach for table lookups, their scaled seeds start within a few units of the optimum
+LOOKUP_REACH = 20
+
+# Refinement rounds before settling on the best army found
+REFINE_ROUNDS = 4
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+def table_config(tribe: str,
+                 troops: list,
+                 troop_levels: dict,
+                 max_troop_limit: dict,
+                 army_size_penalty_coefficient: float,
+                 cavalry_penalty_coefficient: float):
+    """
+    Canonical configuration a table is built for, troops sorted
+
+    Returns (config dict, file name stem)
+    """
+
+    troops = sorted(set(troops))
+    config = {
+        "tribe": tribe,
+        "troops": troops,
+        "troop_levels": [troop_levels.get(troop, 1) for troop in troops],
+        "max_troop_limit": [int(max_troop_limit[troop]) for troop in troops],
+        "army_coeff": float(army_size_penalty_coefficient),
+        "cav_coeff": float(cavalry_penalty_coefficient),
+        # Tables are built from the default profile, any edit of it must lead to a new table
+        "profile_digest": load_profile(DEFAULT_PROFILE).digest
+    }
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+    return config, f"{tribe}-{digest}"
+
+@lru_cache(maxsize=256)
+def _table_stem(tribe: str, troops: tuple, levels: tuple, limits: tuple, army_coeff: float, cav_coeff: float):
+    """table_config stem of hashable arguments, so lookups hash each configuration once per process"""
+
+    return table_config(tribe, list(troops), dict(zip(troops, levels)), dict(zip(troops, limits)), army_coeff, cav_coeff)[1]
+
+def _solve_cell(args):
+    """Worker entry point, exact optimum of the base problem at one grid defense"""
+
+    problem, inf_def, cav_def = args
+    counts, _ = solve_problem(problem._replace(inf_def=inf_def, cav_def=cav_def))
+    return [counts[troop] for troop in problem.troops]
+
+def build_table(tribe: str,
+                troops: list,
+                troop_levels: dict,
+                max_troop_limit: dict,
+                army_size_penalty_coefficient: float = 3.0,
+                cavalry_penalty_coefficient: float = 10.0,
+                table_dir: str = TABLE_DIR):
+    """
+    Solves every grid defense exactly on the process pool and writes the table
+
+    Files:
+    - <stem>.npy: int32 armies of shape (len(INF_DEF_AXIS), len(DEFENSE_RATIO_AXIS), len(troops))
+    - <stem>.json: the configuration and both axes
+
+    Returns the .npy path
+    """
+
+    config, stem = table_config(tribe, troops, troop_levels, max_troop_limit,
+                                army_size_penalty_coefficient, cavalry_penalty_coefficient)
+    levels = dict(zip(config["troops"], config["troop_levels"]))
+    limits = dict(zip(config["troops"], config["max_troop_limit"]))
+    problem = compile_problem(tribe, config["troops"], levels, {}, limits,
+                              army_size_penalty_coefficient, cavalry_penalty_coefficient)
+
+    tasks = [(problem, inf_def, inf_def * ratio) for inf_def in INF_DEF_AXIS for ratio in DEFENSE_RATIO_AXIS]
+    if worker_pool.MAX_WORKERS > 1:
+        cells = worker_pool.get_pool().map(_solve_cell, tasks, chunksize=worker_pool.chunksize_for(len(tasks)))
+    else:
+        cells = map(_solve_cell, tasks)
+    armies = np.array(list(cells), dtype=np.int32).reshape(len(INF_DEF_AXIS), len(DEFENSE_RATIO_AXIS), -1)
+
+    # Write under temporary names first so readers never map a half-written table
+    os.makedirs(table_dir, exist_ok=True)
+    path = os.path.join(table_dir, stem + ".npy")
+    np.save(path + ".tmp.npy", armies)
+    with open(path[:-4] + ".json.tmp", "w") as f:
+        json.dump({**config, "inf_def_axis": INF_DEF_AXIS.tolist(), "defense_ratio_axis": DEFENSE_RATIO_AXIS.tolist()}, f)
+    os.replace(path + ".tmp.npy", path)
+    os.replace(path[:-4] + ".json.tmp", path[:-4] + ".json")
+
+    with _tables_lock:
+        _tables.pop(os.path.join(table_dir, stem), None)
+
+    return path
+
+def load_table(tribe: str,
+               troops: list,
+               troop_levels: dict,
+               max_troop_limit: dict,
+               army_size_penalty_coefficient: float,
+               cavalry_penalty_coefficient: float,
+               table_dir: str = TABLE_DIR):
+    """
+    Memory-maps the table of a configuration, mapped once per process
+
+    Returns (meta, armies) or None when no table was built for it
+    """
+
+    stem = _table_stem(tribe, tuple(troops), tuple(troop_levels.get(troop, 1) for troop in troops),
+                       tuple(int(max_troop_limit[troop]) for troop in troops),
+                       float(army_size_penalty_coefficient), float(cavalry_penalty_coefficient))
+    base = os.path.join(table_dir, stem)
+    table = _tables.get(base)
+    if table is not None:
+        return table
+
+    if not os.path.exists(base + ".npy"):
+        return None
+
+    with open(base + ".json") as f:
+        meta = json.load(f)
+    meta["inf_def_axis"] = np.array(meta["inf_def_axis"])
+    meta["defense_ratio_axis"] = np.array(meta["defense_ratio_axis"])
+    table = (meta, np.load(base + ".npy", mmap_mode="r"))
+    with _tables_lock:
+        _tables[base] = table
+    return table
+
+def refine_army(problem, seeds, stats: dict = None, reach: int = REFINE_REACH):
+    """
+    Local integer search from the seed armies at the problem's real defense: every army within
+    REFINE_WINDOW of a seed on any two troops or within reach on one troop, then the same
+    around the best army found, until nothing improves
+
+    stats, when given, gets "evaluations" and "infeasible" added to it
+
+    Returns (counts tuple, score), or None when no finite army was reached
+    """
+
+    k = len(problem.troops)
+    caps = np.array([int(limit) for limit in problem.limits])
+    offsets = _move_offsets(k, reach)
+    # Grid neighbours often share their army, a set is far cheaper than np.unique on a few rows
+    candidates = np.array(list(dict.fromkeys(map(tuple, np.asarray(seeds, dtype=np.int64).reshape(-1, k).tolist()))),
+                          dtype=np.int64).reshape(-1, k)
+
+    best_army, best_score = None, np.inf
+    for _ in range(REFINE_ROUNDS):
+        armies = (candidates[:, None, :] + offsets[None, :, :]).reshape(-1, k)
+        armies = armies[((armies >= 0) & (armies <= caps)).all(axis=1)]
+        scores, _, _ = problem.evaluate(armies)
+        if stats is not None:
+            stats["evaluations"] = stats.get("evaluations", 0) + len(armies)
+            stats["infeasible"] = stats.get("infeasible", 0) + int(np.isinf(scores).sum())
+        best = int(np.argmin(scores))
+        if scores[best] >= best_score:
+            break
+        best_army, best_score = armies[best], float(scores[best])
+        candidates = best_army[None, :]
+
+    if best_army is None:
+        return None
+    return tuple(int(count) for count in best_army), best_score
+
+@lru_cache(maxsize=8)
+def _window_offsets(k: int):
+    """Every move of at most REFINE_WINDOW units on at most two troops, as a (M, k) array"""
+
+    steps = np.arange(-REFINE_WINDOW, REFINE_WINDOW + 1)
+    moves = [np.zeros((1, k), dtype=np.int64)]
+    for i in range(k):
+        for j in range(i + 1, k):
+            grid_i, grid_j = np.meshgrid(steps, steps, indexing="ij")
+            move = np.zeros((grid_i.size, k), dtype=np.int64)
+            move[:, i], move[:, j] = grid_i.ravel(), grid_j.ravel()
+            moves.append(move)
+        if k == 1:
+            moves.append(steps[:, None])
+    offsets = np.unique(np.concatenate(moves), axis=0)
+    offsets.setflags(write=False)
+    return offsets
+
+@lru_cache(maxsize=8)
+def _move_offsets(k: int, reach: int):
+    """The _window_offsets moves plus every move of at most reach units on one troop, each once"""
+
+    steps = np.arange(-reach, reach + 1)
+    moves = [_window_offsets(k)]
+    for i in range(k):
+        move = np.zeros((len(steps), k), dtype=np.int64)
+        move[:, i] = steps
+        moves.append(move)
+    offsets = np.unique(np.concatenate(moves), axis=0)
+    offsets.setflags(write=False)
+    return offsets
+
+def lookup_army(tribe: str,
+                troops: list,
+                troop_levels: dict,
+                oasis_composition: dict,
+                max_troop_limit: dict,
+                army_size_penalty_coefficient: float = 3.0,
+                cavalry_penalty_coefficient: float = 10.0,
+                table_dir: str = TABLE_DIR):
+    """
+    Army from the precomputed table: the four grid armies around the oasis defense, scaled to
+    it and refined at the exact defense. The refinement is local, so the army is close to but
+    not always the optimum
+
+    Returns (best_counts, best_score), or None when there is no table for the configuration
+    or the oasis lies outside its grid
+    """
+
+    table = load_table(tribe, troops, troop_levels, max_troop_limit,
+                       army_size_penalty_coefficient, cavalry_penalty_coefficient, table_dir)
+    if table is None:
+        return None
+
+    meta, armies = table
+    problem = compile_problem(tribe, troops, troop_levels, oasis_composition, max_troop_limit,
+                              army_size_penalty_coefficient, cavalry_penalty_coefficient)
+    inf_axis, ratio_axis = meta["inf_def_axis"], meta["defense_ratio_axis"]
+
+    # Weak oases sit below the grid but are answered from its first row, the refinement lines
+    # reach the small armies they need
+    inf_def = max(problem.inf_def, inf_axis[0])
+    ratio = problem.cav_def / problem.inf_def if problem.inf_def > 0 else 1.0
+    if inf_def > inf_axis[-1] or not ratio_axis[0] <= ratio <= ratio_axis[-1]:
+        return None
+
+    row = min(max(int(np.searchsorted(inf_axis, inf_def)), 1), len(inf_axis) - 1)
+    column = min(max(int(np.searchsorted(ratio_axis, ratio)), 1), len(ratio_axis) - 1)
+    columns = [meta["troops"].index(troop) for troop in troops]
+    rows = slice(max(row - SEED_REACH, 0), row + SEED_REACH)
+    seeds = np.asarray(armies[rows, max(column - SEED_REACH, 0):column + SEED_REACH])[..., columns]
+    # Optimal armies grow about linearly with the defense, scaling each grid row to the oasis
+    # lands the seeds within a few units of the optimum instead of one grid step away
+    scale = problem.inf_def / inf_axis[rows]
+    seeds = np.minimum(np.rint(seeds * scale[:, None, None]), np.array(problem.limits)).astype(np.int64)
+
+    refined = refine_army(problem, seeds, reach=LOOKUP_REACH)
+    if refined is None:
+        return None
+    counts, score = refined
+    return dict(zip(troops, counts)), score
+
+def main():
+    for path in sys.argv[1:]:
+        with open(path) as f:
+            config = json.load(f)
+        table = build_table(
+            tribe=config["tribe"],
+            troops=config["troops"],
+            troop_levels=config["troop_levels"],
+            max_troop_limit=config["max_troop_limit"],
+            army_size_penalty_coefficient=config["army_coeff"],
+            cavalry_penalty_coefficient=config["cav_coeff"]
+        )
+        print(f"{path}: {table}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import numpy as np
+
+# Percent bonuses on the attack of every unit, each one multiplies it by (1 + percent / 100)
+PERCENT_MODIFIERS = ("hero_offense_percent", "metallurgy_percent", "animal_bonus_percent")
+
+def attack_factor(modifiers: dict):
+    """Product of the percent bonuses, always computed in PERCENT_MODIFIERS order"""
+
+    factor = 1.0
+    for name in PERCENT_MODIFIERS:
+        factor *= 1 + modifiers.get(name, 0.0) / 100
+    return factor
+
+def has_effect(modifiers: dict):
+    return bool(modifiers) and (
+        any(modifiers.get(name, 0.0) for name in PERCENT_MODIFIERS)
+        or any(modifiers.get("weapon_bonus", {}).values())
+    )
+
+def modified_attack(troop: str, attack: float, modifiers: dict):
+    """Scalar form of apply_modifiers for one unit, the same float operations in the same order"""
+
+    if not has_effect(modifiers):
+        return attack
+    return (attack + modifiers.get("weapon_bonus", {}).get(troop, 0.0)) * attack_factor(modifiers)
+
+def apply_modifiers(troops, attack, modifiers: dict = None):
+    """
+    Folds hero, item and alliance bonuses into per-unit attack once per request, so the
+    objective and every engine keep scoring armies as counts times a fixed attack vector
+
+    Parameters:
+    - troops: troop names in the order of `attack`
+    - attack: base attack per unit from troop_vectors
+    - modifiers: optional dict with
+      - hero_offense_percent: the hero's offense bonus on the whole army, e.g. 0.2 per point
+      - metallurgy_percent: alliance metallurgy bonus
+      - animal_bonus_percent: extra strength against animals when raiding oases
+      - weapon_bonus: dict of troop name to attack added to each of its units by the hero's weapon
+
+    Returns a read-only attack array, (attack + weapon_bonus) * every (1 + percent / 100)
+    """
+
+    if not has_effect(modifiers):
+        return attack
+
+    weapons = modifiers.get("weapon_bonus", {})
+    attack = (attack + np.array([weapons.get(troop, 0.0) for troop in troops], dtype=float)) * attack_factor(modifiers)
+    attack.setflags(write=False)
+    return attack
+
+def modifiers_key(modifiers: dict = None):
+    """Hashable form of the modifiers for cache keys, None when they change nothing"""
+
+    if not has_effect(modifiers):
+        return None
+    weapons = tuple(sorted((troop, float(bonus)) for troop, bonus in modifiers.get("weapon_bonus", {}).items() if bonus))
+    return tuple((name, float(modifiers.get(name, 0.0))) for name in PERCENT_MODIFIERS) + (("weapon_bonus", weapons),)
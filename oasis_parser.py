@@ -0,0 +1,86 @@
+import re
+
+from troops_config import OASIS_DEFENSE
+
+# Names of each animal as they appear in pasted reports, matched case-insensitively:
+# English with plurals, German, French, Spanish, Indonesian and Russian game languages
+ANIMAL_NAMES = {
+    "Rat": ["rat", "rats", "ratte", "ratten", "rata", "ratas", "tikus", "крыса", "крысы"],
+    "Spider": ["spider", "spiders", "spinne", "spinnen", "araignée", "araignées", "araña", "arañas",
+               "laba-laba", "паук", "пауки"],
+    "Snake": ["snake", "snakes", "schlange", "schlangen", "serpent", "serpents", "serpiente", "serpientes",
+              "ular", "змея", "змеи"],
+    "Bat": ["bat", "bats", "fledermaus", "fledermäuse", "chauve-souris", "murciélago", "murciélagos",
+            "kelelawar", "летучая мышь", "летучие мыши"],
+    "Boar": ["wild boar", "wild boars", "boar", "boars", "wildschwein", "wildschweine", "sanglier", "sangliers",
+             "jabalí", "jabalíes", "babi hutan", "кабан", "кабаны"],
+    "Wolf": ["wolf", "wolves", "wölfe", "loup", "loups", "lobo", "lobos", "serigala", "волк", "волки"],
+    "Bear": ["bear", "bears", "bär", "bären", "ours", "oso", "osos", "beruang", "медведь", "медведи"],
+    "Crocodile": ["crocodile", "crocodiles", "croco", "krokodil", "krokodile", "cocodrilo", "cocodrilos",
+                  "buaya", "крокодил", "крокодилы"],
+    "Tiger": ["tiger", "tigers", "tigre", "tigres", "harimau", "тигр", "тигры"],
+    "Elephant": ["elephant", "elephants", "elefant", "elefanten", "éléphant", "éléphants", "elefante", "elefantes",
+                 "gajah", "слон", "слоны"]
+}
+
+ANIMAL_BY_NAME = {name: animal for animal, names in ANIMAL_NAMES.items() for name in names}
+
+# Bidi marks the game wraps numbers in, and the minus sign it uses in coordinates
+_CLEANUP = str.maketrans({"\u202a": None, "\u202b": None, "\u202c": None, "\u202d": None, "\u202e": None,
+                          "\u200e": None, "\u200f": None, "\u2212": "-"})
+
+# One pattern for the whole text: a coordinate tag like (12|-34) opens a new oasis, an animal
+# name next to a count on the same line adds to the current one, count first or name first
+_NAMES = "|".join(re.escape(name) for name in sorted(ANIMAL_BY_NAME, key=len, reverse=True))
+_SEPARATOR = r"[^\S\n]*[:x×]?[^\S\n]*"
+_REPORT_PATTERN = re.compile(
+    rf"\(\s*(?P<x>-?\d+)\s*\|\s*(?P<y>-?\d+)\s*\)"
+    rf"|(?<![\w-])(?P<count>\d+){_SEPARATOR}(?P<animal>{_NAMES})(?![\w-])"
+    rf"|(?<![\w-])(?P<animal_first>{_NAMES}){_SEPARATOR}(?P<count_after>\d+)(?![\w-])",
+    re.IGNORECASE
+)
+
+def parse_oasis_reports(text: str):
+    """
+    Parses pasted oasis and scout reports in one pass over the text
+
+    Every coordinate tag like "(12|-34)" starts a new oasis, animal counts before the first
+    tag belong to an untagged oasis. Counts are read from "12 Rats", "Rat: 12", "Ratte 12" and
+    the like on one line, a later count of the same animal in the same oasis replaces it.
+
+    Parameters:
+    - text: one or many concatenated reports
+
+    Returns a list of {"coordinates": {"x", "y"} or None, "oasis_composition": {...}} in text
+    order, oases without any animals included so empty oases can be farmed too
+    """
+
+    oases = []
+    current = None
+    for match in _REPORT_PATTERN.finditer(text.translate(_CLEANUP)):
+        if match.group("x") is not None:
+            current = {"coordinates": {"x": int(match.group("x")), "y": int(match.group("y"))}, "oasis_composition": {}}
+            oases.append(current)
+            continue
+
+        if current is None:
+            current = {"coordinates": None, "oasis_composition": {}}
+            oases.append(current)
+        name = match.group("animal") or match.group("animal_first")
+        count = match.group("count") or match.group("count_after")
+        current["oasis_composition"][ANIMAL_BY_NAME[name.lower()]] = int(count)
+
+    return oases
+
+def parse_oasis(text: str):
+    """
+    Single oasis composition from pasted text, every animal of OASIS_DEFENSE present, the
+    counts of all reports in the text merged
+
+    Returns dict of animal name to count
+    """
+
+    composition = {animal: 0 for animal in OASIS_DEFENSE}
+    for oasis in parse_oasis_reports(text):
+        composition.update(oasis["oasis_composition"])
+    return composition
@@ -1,5 +1,7 @@
 from scipy.optimize import dual_annealing
 
+from troops_config import OASIS_DEFENSE
+
 # Troops Stats
 TROOPS = {
     "CS": {
@@ -30,19 +32,8 @@ OASIS_TROOPS = {
     "elephant": 0
 }
 
-# Oasis 
-ANIMAL_DEF = {
-    "rat": (25, 20),
-    "spider": (35, 40),
-    "snake": (40, 60),
-    "bat": (66, 50),
-    "boar": (70, 33),
-    "wolf": (80, 70),
-    "bear": (140, 200),
-    "crocodile": (380, 240),
-    "tiger": (170, 250),
-    "elephant": (440, 500)
-}
+# Oasis defense, read from the default server profile like the optimizer
+ANIMAL_DEF = {animal.lower(): defense for animal, defense in OASIS_DEFENSE.items()}
 
 # Bound
 MAX_CS = 500
@@ -0,0 +1,162 @@
+import itertools
+
+import numpy as np
+
+from lookup_table import _window_offsets
+from problem import compile_problem
+from troops_config import DEFAULT_PROFILE
+
+# Mixed armies are seeded along power shares that are multiples of 1 / parts, by troop count
+FRONT_RAY_PARTS = (1, 16, 8, 6)
+
+# Army sizes scanned along each of those shares
+FRONT_RAY_STEPS = 1024
+
+# Rounds of neighbourhood search around the front before settling
+FRONT_ROUNDS = 8
+
+# Reach of the single-troop moves tried around each front army
+FRONT_REACH = 64
+
+# Lattices with at most this many armies are enumerated, which makes the front exact
+FRONT_ENUMERATE_LIMIT = 1 << 21
+
+# Armies scored per NumPy call while enumerating
+FRONT_CHUNK = 1 << 18
+
+def front_of(armies, losses, sizes):
+    """
+    Non-dominated subset of (size, loss) points: sorted by growing size, each kept point
+    loses strictly less than every smaller army, ties go to the lexicographically smallest army
+
+    Returns (armies, losses, sizes) of the front
+    """
+
+    order = np.lexsort(tuple(armies.T[::-1]) + (losses, sizes))
+    armies, losses, sizes = armies[order], losses[order], sizes[order]
+    running = np.minimum.accumulate(losses)
+    keep = losses < np.concatenate([[np.inf], running[:-1]])
+    return armies[keep], losses[keep], sizes[keep]
+
+def loss_size_front(problem, cavalry_weight: float = 1.0):
+    """
+    Pareto front between resource loss and army size for one oasis
+
+    Every army is scored by its loss cost (loss_function with army_size_penalty_coefficient
+    = 0) and its size (infantry count + cavalry_weight * cavalry count). Candidates come from
+    single-troop lines and from rays that keep a fixed share of power per troop, scaled from
+    one unit up to the caps. The front is then refined with two-troop windows like refine_army
+    and single-troop moves within FRONT_REACH around each new front army until it stops
+    changing. Lattices of
+    at most FRONT_ENUMERATE_LIMIT armies are enumerated instead and the front is exact.
+
+    Parameters:
+    - problem: CompiledProblem, its limits must be finite
+    - cavalry_weight: size of one cavalry unit, pass cavalry_penalty_coefficient to make the
+      size the objective's army-size term
+
+    Returns (armies, losses, sizes) sorted by growing size, armies as an (M, k) int array
+    """
+
+    k = len(problem.troops)
+    caps = np.array([max(0, int(limit)) for limit in problem.limits])
+    loss_problem = problem._replace(army_size_penalty_coefficient=0.0)
+    weights = np.where(problem.is_cavalry, cavalry_weight, 1.0)
+
+    def score(armies):
+        armies = armies[((armies >= 0) & (armies <= caps)).all(axis=1)]
+        losses, _, _ = loss_problem.evaluate(armies)
+        feasible = np.isfinite(losses)
+        return armies[feasible], losses[feasible], armies[feasible] @ weights
+
+    def lines(bases, reach=None):
+        """Every count of one troop with the others fixed, or only the counts within reach"""
+
+        blocks = []
+        for i in range(k):
+            steps = np.arange(caps[i] + 1) if reach is None else np.arange(-reach, reach + 1)
+            armies = np.repeat(bases, len(steps), axis=0)
+            if reach is None:
+                armies[:, i] = np.tile(steps, len(bases))
+            else:
+                armies[:, i] += np.tile(steps, len(bases))
+            blocks.append(armies)
+        return np.concatenate(blocks)
+
+    if np.prod(caps + 1, dtype=float) <= FRONT_ENUMERATE_LIMIT:
+        lattice = np.stack(np.meshgrid(*(np.arange(cap + 1) for cap in caps), indexing="ij"), axis=-1).reshape(-1, k)
+        front = None
+        for first in range(0, len(lattice), FRONT_CHUNK):
+            chunk = score(lattice[first:first + FRONT_CHUNK])
+            front = front_of(*(chunk if front is None else [np.concatenate(parts) for parts in zip(front, chunk)]))
+        return front
+
+    # Step 1: Single-troop armies and mixed armies along fixed power shares
+    blocks = [lines(np.zeros((1, k), dtype=np.int64))]
+    parts = FRONT_RAY_PARTS[min(k, len(FRONT_RAY_PARTS)) - 1]
+    for split in itertools.product(range(parts + 1), repeat=k):
+        share = np.array(split) / parts
+        used = share > 0
+        if sum(split) != parts or max(split) == parts or not (caps[used] > 0).all():
+            continue
+        top = (caps[used] * problem.attack[used] / share[used]).min()
+        power = np.linspace(0, top, FRONT_RAY_STEPS)
+        blocks.append(np.minimum(np.rint(np.outer(power, share / problem.attack)), caps).astype(np.int64))
+    front = front_of(*score(np.unique(np.concatenate(blocks), axis=0)))
+
+    # Step 2: Neighbourhoods of the new front armies until the front stops changing
+    offsets = _window_offsets(k)
+    visited = set()
+    for _ in range(FRONT_ROUNDS):
+        armies = np.array([army for army in front[0] if army.tobytes() not in visited]).reshape(-1, k)
+        if not len(armies):
+            break
+        visited.update(army.tobytes() for army in armies)
+        candidates = np.concatenate([(armies[:, None, :] + offsets[None, :, :]).reshape(-1, k), lines(armies, FRONT_REACH)])
+        front = front_of(*(np.concatenate(parts) for parts in zip(front, score(np.unique(candidates, axis=0)))))
+
+    return front
+
+def pareto_front(tribe: str,
+                 troops: list,
+                 troop_levels: dict,
+                 oasis_composition: dict,
+                 max_troop_limit: dict,
+                 cavalry_weight: float = 1.0,
+                 profile: str = DEFAULT_PROFILE):
+    """
+    Every army worth sending against an oasis, trading total_loss_cost against army size.
+
+    For any army_size_penalty_coefficient the loss_function optimum is the front point with
+    the lowest total_loss_cost + army_size_penalty_coefficient * army_size when cavalry_weight
+    equals cavalry_penalty_coefficient, so a UI can move along the front with no further calls.
+
+    Parameters:
+    - tribe: e.g., "Teuton"
+    - troops: list of troop names
+    - troop_levels: dict of levels
+    - oasis_composition: dict of animal name to count, e.g., {"Rat": 12, "Spider": 10}
+    - max_troop_limit: upper bound for each troop
+    - cavalry_weight: army size of one cavalry unit, 1 counts heads
+    - profile: server profile name
+
+    Returns a dict with troops and front, a list sorted by growing army_size of
+    {counts, army_size, total_loss_cost, loss_percent}, counts in troops order
+    """
+
+    problem = compile_problem(tribe, troops, troop_levels, oasis_composition, max_troop_limit, profile=profile)
+    armies, losses, sizes = loss_size_front(problem, cavalry_weight)
+    _, loss_percent, _ = problem.evaluate(armies)
+
+    return {
+        "troops": list(troops),
+        "front": [
+            {
+                "counts": counts,
+                "army_size": size,
+                "total_loss_cost": int(loss),
+                "loss_percent": percent
+            }
+            for counts, size, loss, percent in zip(armies.tolist(), sizes.tolist(), losses.tolist(), loss_percent.tolist())
+        ]
+    }
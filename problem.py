@@ -0,0 +1,138 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from batch_loss import evaluate_armies, troop_vectors
+from modifiers import apply_modifiers
+from troops_config import DEFAULT_PROFILE, compute_oasis_defense
+
+class CompiledProblem(NamedTuple):
+    """
+    Everything loss_function resolves from dicts, resolved once per optimization run.
+
+    Fields:
+    - tribe, troops: the army spec, troops fixes the column order
+    - attack, cost, is_cavalry: read-only vectors from troop_vectors
+    - limits: per-troop upper bound, inf when max_troop_limit has no entry
+    - inf_def, cav_def: oasis defense from compute_oasis_defense
+    - army_size_penalty_coefficient, cavalry_penalty_coefficient: objective coefficients
+    - terms: per-troop (attack, cost, is_cavalry, limit) as plain Python scalars for the scalar path
+    """
+
+    tribe: str
+    troops: tuple
+    attack: np.ndarray
+    cost: np.ndarray
+    is_cavalry: np.ndarray
+    limits: tuple
+    inf_def: float
+    cav_def: float
+    army_size_penalty_coefficient: float
+    cavalry_penalty_coefficient: float
+    terms: tuple
+
+    def objective(self, x):
+        """
+        loss_function_vectorized without dict lookups: rounds x to troop counts and scores them.
+        Operations run in the same order as loss_function, so results are identical.
+        """
+
+        # Rounding NumPy scalars one by one dominates the call, convert the row once
+        values = x.tolist() if isinstance(x, np.ndarray) else x
+        counts = []
+        inf_pow, cav_pow = 0.0, 0.0
+        army_size_penalty = 0
+        for value, (atk, _, cavalry, limit) in zip(values, self.terms):
+            count = int(round(value))
+            if count > limit:
+                return float("inf") # Punish infinitely
+            counts.append(count)
+            if cavalry:
+                cav_pow += count * atk
+                army_size_penalty += count * self.cavalry_penalty_coefficient
+            else:
+                inf_pow += count * atk
+                army_size_penalty += count
+
+        if sum(counts) == 0:
+            return float("inf") # Punish infinitely
+
+        total_pow = inf_pow + cav_pow
+        if total_pow == 0:
+            return float("inf")
+
+        inf_pow_ratio = inf_pow / total_pow if inf_pow != 0 else 0.0
+        cav_pow_ratio = cav_pow / total_pow if cav_pow != 0 else 0.0
+        effective_defense = self.inf_def * inf_pow_ratio + self.cav_def * cav_pow_ratio
+        loss_percent = 100 * (effective_defense / total_pow) ** 1.5
+
+        loss_cost_penalty = 0
+        for count, (_, cost, _, _) in zip(counts, self.terms):
+            loss_cost_penalty += round(count * loss_percent / 100) * cost
+
+        return loss_cost_penalty + army_size_penalty * self.army_size_penalty_coefficient
+
+    def evaluate(self, armies):
+        """
+        Batched objective over an (N, k) array of armies, see batch_loss.evaluate_armies
+
+        Returns (objective_scores, loss_percent, troop_losses)
+        """
+
+        armies = np.asarray(armies).reshape(-1, len(self.troops))
+        scores, loss_percent, troop_losses = evaluate_armies(
+            armies, self.attack, self.cost, self.is_cavalry, self.inf_def, self.cav_def,
+            self.army_size_penalty_coefficient, self.cavalry_penalty_coefficient
+        )
+        scores[(armies > np.array(self.limits)).any(axis=1)] = np.inf # Punish infinitely
+
+        return scores, loss_percent, troop_losses
+
+def compile_problem(tribe: str,
+                    troops: list,
+                    troop_levels: dict,
+                    oasis_composition: dict,
+                    max_troop_limit: dict = None,
+                    army_size_penalty_coefficient: float = 5.0,
+                    cavalry_penalty_coefficient: float = 2.5,
+                    profile: str = DEFAULT_PROFILE,
+                    modifiers: dict = None):
+    """
+    Builds the immutable problem once per run
+
+    Parameters:
+    - tribe: e.g., "Teuton"
+    - troops: list of troop names
+    - troop_levels: dict of levels, missing troops default to level 1
+    - oasis_composition: dict of animal name to count, e.g., {"Rat": 12, "Spider": 10}
+    - max_troop_limit: optional upper bound for each troop
+    - army_size_penalty_coefficient: penalty per army size
+    - cavalry_penalty_coefficient: penalty per cavalry unit
+    - profile: server profile name of the troop and animal stats
+    - modifiers: optional attack bonuses folded into the attack vector, see modifiers.apply_modifiers
+
+    Returns CompiledProblem
+    """
+
+    attack, cost, is_cavalry = troop_vectors(tribe, troops, troop_levels, profile)
+    attack = apply_modifiers(troops, attack, modifiers)
+    inf_def, cav_def = compute_oasis_defense(oasis_composition, profile)
+    limits = tuple(
+        max_troop_limit.get(troop, float("inf")) if max_troop_limit else float("inf")
+        for troop in troops
+    )
+    terms = tuple(zip(attack.tolist(), [int(c) for c in cost], is_cavalry.tolist(), limits))
+
+    return CompiledProblem(
+        tribe=tribe,
+        troops=tuple(troops),
+        attack=attack,
+        cost=cost,
+        is_cavalry=is_cavalry,
+        limits=limits,
+        inf_def=inf_def,
+        cav_def=cav_def,
+        army_size_penalty_coefficient=army_size_penalty_coefficient,
+        cavalry_penalty_coefficient=cavalry_penalty_coefficient,
+        terms=terms
+    )
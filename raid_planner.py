@@ -0,0 +1,371 @@
+import heapq
+import itertools
+
+import numpy as np
+
+import worker_pool
+from problem import compile_problem
+from troops_config import DEFAULT_PROFILE, load_profile
+from troops_optimizer import count_loss_percentage
+
+# Subgradient steps spent on the Lagrange multipliers
+MAX_ITERATIONS = 300
+
+# Coordinate-descent rounds used to trace each oasis cost curve
+CURVE_ROUNDS = 8
+
+# Half-width of the two-troop neighbourhood scanned around each oasis' best army
+CURVE_WINDOW = 20
+
+# Mixed armies are seeded along power shares that are multiples of 1 / parts, by troop count
+RAY_PARTS = (1, 8, 4, 4)
+
+# Army sizes scanned along each of those shares
+RAY_STEPS = 512
+
+# Seeds polished into local optima
+CURVE_RESTARTS = 3
+
+# Relative duality gap at which the search stops early
+GAP_TOLERANCE = 1e-6
+
+def oasis_cost_curve(problem, caps):
+    """
+    Candidate armies for one oasis, traced along lines of growing armies: single-troop lines,
+    rays that keep a fixed share of power per troop, and coordinate lines through local optima
+    polished from the best of those. Along each line only the armies that beat every smaller
+    army on it are kept, anything past the running minimum can never be worth its extra troops.
+
+    Parameters:
+    - problem: CompiledProblem for the oasis
+    - caps: per-troop upper bound, the shared troop totals
+
+    Returns (armies, scores), armies as an (M, k) int array
+    """
+
+    k = len(caps)
+    armies_seen, scores_seen = [], []
+
+    def scan(lines, keep):
+        """
+        Scores a list of army blocks in one call, each ordered by growing troop counts when
+        keep[b] is set, in which case the block's improving armies join the curve
+        Returns the best (army, score) of every block
+        """
+
+        armies = np.concatenate(lines)
+        scores, _, _ = problem.evaluate(armies)
+        bests = []
+        blocks = np.split(np.arange(len(armies)), np.cumsum([len(line) for line in lines])[:-1])
+        for block, keep_block in zip(blocks, keep):
+            block_scores = scores[block]
+            if keep_block:
+                running = np.minimum.accumulate(block_scores)
+                improving = block[block_scores < np.concatenate([[np.inf], running[:-1]])]
+                armies_seen.append(armies[improving])
+                scores_seen.append(scores[improving])
+            best = block[np.argmin(block_scores)]
+            bests.append((armies[best], scores[best]))
+        return bests
+
+    def line(base, i):
+        armies = np.tile(base, (caps[i] + 1, 1))
+        armies[:, i] = np.arange(caps[i] + 1)
+        return armies
+
+    def ray(share):
+        """Armies splitting their power by `share`, scaled from nothing up to the caps"""
+
+        used = share > 0
+        top = (caps[used] * problem.attack[used] / share[used]).min()
+        power = np.linspace(0, top, RAY_STEPS)
+        return np.minimum(np.rint(np.outer(power, share / problem.attack)), caps).astype(np.int64)
+
+    def window(base, i, j):
+        grid_i, grid_j = np.meshgrid(
+            np.arange(max(0, base[i] - CURVE_WINDOW), min(caps[i], base[i] + CURVE_WINDOW) + 1),
+            np.arange(max(0, base[j] - CURVE_WINDOW), min(caps[j], base[j] + CURVE_WINDOW) + 1),
+            indexing="ij"
+        )
+        armies = np.tile(base, (grid_i.size, 1))
+        armies[:, i], armies[:, j] = grid_i.ravel(), grid_j.ravel()
+        return armies
+
+    def polish(best_army, best_score):
+        """Coordinate lines and two-troop windows until neither improves, lines alone stall on the rounding steps"""
+
+        for _ in range(CURVE_ROUNDS):
+            lines = [line(best_army, i) for i in range(k)]
+            windows = [window(best_army, i, j) for i in range(k) for j in range(i + 1, k)]
+            bests = scan(lines + windows, [True] * len(lines) + [False] * len(windows))
+            army, score = min(bests, key=lambda best: best[1])
+            if score >= best_score:
+                return
+            best_army, best_score = army, score
+
+    # Step 1: Single-troop armies and mixed armies along fixed power shares
+    blocks = [line(np.zeros(k, dtype=np.int64), i) for i in range(k)]
+    parts = RAY_PARTS[min(k, len(RAY_PARTS)) - 1]
+    for split in itertools.product(range(parts + 1), repeat=k):
+        share = np.array(split) / parts
+        if sum(split) == parts and max(split) < parts and (caps[share > 0] > 0).all():
+            blocks.append(ray(share))
+    seeds = scan(blocks, [True] * len(blocks))
+
+    # Step 2: Polish the best seeds, pure and mixed armies often sit in separate basins
+    if k > 1:
+        seeds.sort(key=lambda seed: seed[1])
+        for army, score in seeds[:CURVE_RESTARTS]:
+            if np.isfinite(score):
+                polish(army, score)
+
+    armies = np.concatenate(armies_seen)
+    scores = np.concatenate(scores_seen)
+    armies, unique = np.unique(armies, axis=0, return_index=True)
+    return armies, scores[unique]
+
+def _oasis_cost_curve(args):
+    """Worker entry point, compiles one oasis and returns its cost curve"""
+
+    tribe, troops, troop_levels, oasis_composition, army_coeff, cav_coeff, caps, profile = args
+    problem = compile_problem(tribe, troops, troop_levels, oasis_composition, None, army_coeff, cav_coeff, profile)
+    return oasis_cost_curve(problem, caps)
+
+def plan_raids(tribe: str,
+               troops: list,
+               troop_levels: dict,
+               available_troops: dict,
+               oases: list,
+               army_size_penalty_coefficient: float = 3.0,
+               cavalry_penalty_coefficient: float = 10.0,
+               profile: str = DEFAULT_PROFILE):
+    """
+    Splits a shared troop pool across many oases.
+
+    Every oasis is either skipped or raided with one army, and the plan minimises the total
+    loss_function objective (losses plus army-size penalty) minus the value of the raided
+    oases while never sending more than `available_troops` in total.
+
+    Cost curves are built per oasis on the shared process pool. The coupling constraint is
+    relaxed with one Lagrange multiplier (a price per unit) for each troop: given the prices
+    every oasis independently picks the cheapest point of its cost curve, and the prices
+    follow Polyak subgradient steps. Once the prices settle, the relaxed plan of the best
+    prices is repaired by downgrading the armies that free troops most cheaply, then any
+    leftover troops are handed to the oases they improve most. lower_bound is the best dual
+    value, no plan built from the cost curves can beat it.
+
+    Parameters:
+    - tribe: e.g., "Teuton"
+    - troops: list of troop names
+    - troop_levels: dict of levels
+    - available_troops: total count of each troop at home, e.g., {"Clubswinger": 2000}
+    - oases: list of {"oasis_composition": {...}, "value": float}, value in the same units as the loss cost
+    - army_size_penalty_coefficient: penalty per army size
+    - cavalry_penalty_coefficient: penalty per cavalry unit
+    - profile: server profile name
+
+    Returns a dict with one allocation per oasis (None when skipped), used_troops,
+    total_objective, total_value, net_objective and lower_bound
+    """
+
+    k = len(troops)
+    totals = np.array([max(0, int(available_troops[troop])) for troop in troops])
+    values = np.array([float(oasis["value"]) for oasis in oases])
+
+    # Step 1: Cost curve of every oasis, spread over the process pool, a zero "skip" row first in each segment
+    tasks = [
+        (tribe, troops, troop_levels, oasis["oasis_composition"],
+         army_size_penalty_coefficient, cavalry_penalty_coefficient, totals, profile)
+        for oasis in oases
+    ]
+    if len(tasks) > 1 and worker_pool.MAX_WORKERS > 1:
+        curves = worker_pool.get_pool().map(_oasis_cost_curve, tasks, chunksize=worker_pool.chunksize_for(len(tasks)))
+    else:
+        curves = map(_oasis_cost_curve, tasks)
+
+    rows_x, rows_score, owner = [], [], []
+    for index, (armies, scores) in enumerate(curves):
+        rows_x.append(np.zeros((1, k), dtype=np.int64))
+        rows_score.append(np.zeros(1))
+        rows_x.append(armies)
+        rows_score.append(scores - values[index])
+        owner.append(np.full(len(armies) + 1, index))
+
+    x = np.concatenate(rows_x) if oases else np.zeros((0, k), dtype=np.int64)
+    net = np.concatenate(rows_score) if oases else np.zeros(0)
+    owner = np.concatenate(owner) if oases else np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]]) if len(owner) else np.zeros(0, dtype=np.int64)
+    # Rows of oasis i are bounds[i]:bounds[i + 1]
+    bounds = np.r_[starts, len(owner)]
+    x_float = x.astype(float)
+
+    def choose(prices):
+        """Cheapest row of each oasis at the given prices, and the dual value"""
+
+        reduced = net + x_float @ prices
+        segment_min = np.minimum.reduceat(reduced, starts)
+        rows = np.flatnonzero(reduced == segment_min[owner])
+        _, first = np.unique(owner[rows], return_index=True)
+        return rows[first], segment_min.sum() - prices @ totals
+
+    def usage(choice):
+        return x[choice].sum(axis=0) if len(choice) else np.zeros(k, dtype=np.int64)
+
+    def downgrade(index, current, over):
+        """
+        Cheapest downgrade of one oasis as (key, row): the objective rise per freed over-used
+        unit, or the drop itself when the objective falls, (inf, -1) when no army of its curve
+        fits inside the current one and frees an over-used troop
+        """
+
+        rows = np.arange(bounds[index], bounds[index + 1])
+        freed = x[current] - x[rows]
+        allowed = (freed >= 0).all(axis=1) & (freed[:, over > 0] > 0).any(axis=1)
+        if not allowed.any():
+            return np.inf, -1
+        rise = net[rows] - net[current]
+        gain = np.minimum(freed, over).sum(axis=1)
+        key = np.where(allowed, np.where(rise > 0, rise / np.maximum(gain, 1), rise), np.inf)
+        best = int(np.argmin(key))
+        return float(key[best]), int(rows[best])
+
+    def upgrade(index, current, slack):
+        """Move of one oasis that lowers the objective most within the spare troops, as (drop, row)"""
+
+        rows = np.arange(bounds[index], bounds[index + 1])
+        fits = (x[rows] - x[current] <= slack).all(axis=1)
+        drop = np.where(fits, net[rows] - net[current], np.inf)
+        best = int(np.argmin(drop))
+        return float(drop[best]), int(rows[best])
+
+    def repair(choice):
+        """
+        Downgrades armies until the plan fits the pool, cheapest freed unit first
+
+        An oasis' cheapest downgrade only gets dearer as the overshoot shrinks, so each oasis
+        keeps one heap entry that is rescored when popped and applied once still the cheapest.
+        """
+
+        choice = choice.copy()
+        used = usage(choice)
+        over = np.maximum(used - totals, 0)
+        heap = [(key, index) for index in range(len(choice)) for key, _ in [downgrade(index, choice[index], over)]]
+        heapq.heapify(heap)
+        while over.any() and heap:
+            _, index = heapq.heappop(heap)
+            key, row = downgrade(index, choice[index], over)
+            if row < 0:
+                continue
+            if heap and key > heap[0][0]:
+                heapq.heappush(heap, (key, index))
+                continue
+            used -= x[choice[index]] - x[row]
+            over = np.maximum(used - totals, 0)
+            choice[index] = row
+            heapq.heappush(heap, (downgrade(index, row, over)[0], index))
+        return choice
+
+    def improve(choice):
+        """
+        Spends leftover troops on the oasis upgrades that lower the objective most
+
+        Moves that only take troops can only shrink the other oases' options, their heap
+        entries are rescored when popped; a move that hands troops back rescores every oasis.
+        """
+
+        choice = choice.copy()
+        slack = totals - usage(choice)
+        heap = []
+        while True:
+            if not heap:
+                heap = [(drop, index) for index in range(len(choice))
+                        for drop, _ in [upgrade(index, choice[index], slack)] if drop < 0]
+                heapq.heapify(heap)
+                if not heap:
+                    return choice
+            _, index = heapq.heappop(heap)
+            drop, row = upgrade(index, choice[index], slack)
+            if drop >= 0:
+                continue
+            if heap and drop > heap[0][0]:
+                heapq.heappush(heap, (drop, index))
+                continue
+            released = x[choice[index]] - x[row]
+            slack += released
+            choice[index] = row
+            if (released > 0).any():
+                heap = []
+            else:
+                heapq.heappush(heap, (upgrade(index, row, slack)[0], index))
+
+    # Step 2: Subgradient search on the prices, skipping everything is the first feasible plan
+    best_choice = starts.copy()
+    best_net = 0.0
+    bound_choice = best_choice
+    lower_bound = -np.inf
+    prices = np.zeros(k)
+    step_scale, stalled = 2.0, 0
+    for iteration in range(MAX_ITERATIONS if len(oases) else 0):
+        choice, dual = choose(prices)
+        if dual - lower_bound > GAP_TOLERANCE * (abs(dual) + 1):
+            lower_bound, stalled, bound_choice = dual, 0, choice
+        else:
+            stalled += 1
+            if stalled >= 20:
+                step_scale, stalled = step_scale / 2, 0
+
+        # Relaxed plans that happen to fit the pool are feasible as they stand
+        surplus = usage(choice) - totals
+        if (surplus <= 0).all() and net[choice].sum() < best_net:
+            best_choice, best_net = choice, net[choice].sum()
+
+        if best_net - lower_bound <= GAP_TOLERANCE * (abs(best_net) + 1):
+            break
+
+        # Prices of troops nobody wants can only drop to zero
+        gradient = np.where((prices <= 0) & (surplus < 0), 0.0, surplus)
+        if not gradient.any() or step_scale < 1e-6:
+            break
+        prices = np.maximum(0.0, prices + step_scale * (best_net - lower_bound) / (gradient @ gradient) * gradient)
+
+    # Step 3: Repair the relaxed plan of the best prices, then spend leftover troops on it and the best feasible plan
+    for choice in (bound_choice, best_choice):
+        choice = improve(repair(choice))
+        if net[choice].sum() < best_net:
+            best_choice, best_net = choice, net[choice].sum()
+
+    # Step 4: Decode the plan
+    tribe_data = load_profile(profile).troops_table[tribe]
+    allocations = []
+    used = np.zeros(k, dtype=np.int64)
+    total_objective, total_value = 0.0, 0.0
+    for index, oasis in enumerate(oases):
+        row = best_choice[index]
+        if not x[row].any():
+            allocations.append(None)
+            continue
+
+        counts = dict(zip(troops, (int(count) for count in x[row])))
+        loss_percent = count_loss_percentage(tribe, counts, troop_levels, oasis["oasis_composition"], profile)
+        troop_losses = {troop: round(count * loss_percent / 100) for troop, count in counts.items()}
+        score = float(net[row] + values[index])
+        used += x[row]
+        total_objective += score
+        total_value += float(values[index])
+        allocations.append({
+            "best_counts": counts,
+            "objective_score": score,
+            "loss_percent": loss_percent,
+            "troop_losses": troop_losses,
+            "total_loss_cost": sum(loss * tribe_data[troop]["cost"] for troop, loss in troop_losses.items()),
+            "value": float(values[index])
+        })
+
+    return {
+        "allocations": allocations,
+        "used_troops": dict(zip(troops, (int(count) for count in used))),
+        "total_objective": total_objective,
+        "total_value": total_value,
+        "net_objective": total_objective - total_value,
+        "lower_bound": float(lower_bound) if np.isfinite(lower_bound) else None
+    }
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from cachetools import TTLCache
+
+from troops_config import DEFAULT_PROFILE, load_profile
+
+# Most results kept in memory, least recently used ones are evicted first
+CACHE_MAXSIZE = 4096
+
+# Seconds a cached result stays valid
+CACHE_TTL_SECONDS = 3600
+
+# SQLite file shared by every worker process on the machine
+PERSISTENT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "results.sqlite3")
+
+# Compressed bytes kept on disk, least recently used entries are evicted past it
+PERSISTENT_MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds a result stays valid on disk, it outlives restarts; profile edits change the key instead
+PERSISTENT_TTL_SECONDS = 7 * 24 * 3600
+
+# Puts between two size checks, the check sums the whole table
+EVICT_EVERY = 256
+
+# Reads refresh an entry's access time at most this often, so hot keys do not turn every read into a write
+ACCESS_RESOLUTION_SECONDS = 60
+
+# Bump when the key or value encoding changes, old entries then stop matching
+CACHE_FORMAT = 1
+
+# Seconds a connection waits for another process's write lock
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# Options left out of the key at these values, so every caller gets the same key whether it
+# passes them or not
+OPTION_DEFAULTS = {"starts": 1, "profile": DEFAULT_PROFILE, "modifiers": None}
+
+def canonical_request_key(tribe: str,
+                          troops: list,
+                          troop_levels: dict,
+                          oasis_composition: dict,
+                          max_troop_limit: dict,
+                          army_size_penalty_coefficient: float,
+                          cavalry_penalty_coefficient: float,
+                          engine: str,
+                          options: dict = None):
+    """
+    Hashable key under which equivalent optimization requests collide
+
+    - options: other arguments that change the result, e.g. starts or profile; the ones at their
+      OPTION_DEFAULTS value are dropped, so the single, batch, stream and sweep paths share keys
+    - troops are sorted, duplicates removed
+    - levels and limits are kept only for the requested troops, missing levels default to 1
+      like in compute_offense_split
+    - animals with a zero count or no oasis defense are dropped since they change nothing
+    - the digest of the server profile named in options (the default one otherwise) is part of
+      the key, so results computed before a profile file changed are never served after it
+
+    Returns a tuple
+    """
+
+    options = {
+        name: value for name, value in (options or {}).items()
+        if name not in OPTION_DEFAULTS or value != OPTION_DEFAULTS[name]
+    }
+    profile = load_profile(options.get("profile", DEFAULT_PROFILE))
+    troops = tuple(sorted(set(troops)))
+    levels = tuple(troop_levels.get(troop, 1) for troop in troops)
+    limits = tuple(max_troop_limit[troop] for troop in troops)
+    oasis = tuple(sorted(
+        (animal, count) for animal, count in oasis_composition.items()
+        if count != 0 and animal in profile.oasis_table
+    ))
+
+    return (tribe, troops, levels, limits, oasis,
+            float(army_size_penalty_coefficient), float(cavalry_penalty_coefficient), engine,
+            tuple(sorted(options.items())), profile.digest)
+
+def key_digest(key):
+    """16-byte digest of a canonical_request_key, stable across processes and restarts"""
+
+    return hashlib.blake2b(repr((CACHE_FORMAT, key)).encode(), digest_size=16).digest()
+
+class PersistentStore:
+    """
+    Result store in a SQLite file, shared by every process that opens the same path.
+
+    Entries are zlib-compressed JSON under key_digest, so floats round-trip exactly. The file
+    runs in WAL mode: readers never block and writers queue on SQLite's lock for up to
+    BUSY_TIMEOUT_SECONDS. Each thread opens its own connection, reopened after a fork. Disk
+    errors are counted and treated as misses, a broken store never fails a request.
+    """
+
+    def __init__(self, path: str = PERSISTENT_CACHE_PATH, max_bytes: int = PERSISTENT_MAX_BYTES,
+                 ttl: float = PERSISTENT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.errors = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "stored REAL NOT NULL, accessed REAL NOT NULL) WITHOUT ROWID"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key):
+        """Returns the stored result for `key`, or None when missing, expired or unreadable"""
+
+        digest, now = key_digest(key), time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value, stored, accessed FROM results WHERE key = ?", (digest,)).fetchone()
+            if row is None or row[1] < now - self.ttl:
+                return None
+            if now - row[2] > ACCESS_RESOLUTION_SECONDS:
+                connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, digest))
+            return json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, OSError, zlib.error, ValueError):
+            self.errors += 1
+            return None
+
+    def put(self, key, result):
+        value = zlib.compress(json.dumps(result, separators=(",", ":")).encode())
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO results (key, value, size, stored, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key_digest(key), value, len(value), now, now)
+            )
+            with self._lock:
+                self._puts += 1
+                check = self._puts % EVICT_EVERY == 0
+            if check:
+                self.evict()
+        except (sqlite3.Error, OSError):
+            self.errors += 1
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until the file holds 90% of max_bytes"""
+
+        connection = self._connection()
+        connection.execute("DELETE FROM results WHERE stored < ?", (time.time() - self.ttl,))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > self.max_bytes * 0.9:
+            freed = connection.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT 64) RETURNING size"
+            ).fetchall()
+            if not freed:
+                break
+            total -= sum(size for size, in freed)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM results")
+
+    def stats(self):
+        try:
+            entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        except (sqlite3.Error, OSError):
+            entries, size = None, None
+        return {"path": self.path, "entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl, "errors": self.errors}
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a TTL, counting hits and misses.
+    Sync FastAPI endpoints run in a thread pool, so every access goes through one lock.
+    With a PersistentStore behind it, memory misses fall through to disk and every result is
+    written to both, so results survive restarts and are shared by all worker processes.
+    """
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_TTL_SECONDS, store: PersistentStore = None):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.store = store
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached result for `key`, or None"""
+
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self.hits += 1
+                return result
+
+        # Disk reads run outside the lock, they may wait on another process
+        result = self.store.get(key) if self.store is not None else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.disk_hits += 1
+                self._cache[key] = result
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._cache[key] = result
+        if self.store is not None:
+            self.store.put(key, result)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "size": self._cache.currsize,
+                "maxsize": self._cache.maxsize,
+                "ttl_seconds": self._cache.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses
+            }
+        if self.store is not None:
+            stats["persistent"] = self.store.stats()
+        return stats
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the computation, the
+    ones arriving while it is in flight wait for it and share its result or its exception.
+    Nothing is kept once the call returns, the ResultCache covers later calls.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, compute):
+        """
+        Returns (compute(), coalesced), coalesced being True when another caller computed it.
+        Followers get the leader's result object itself, so it must not be mutated.
+        """
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = compute()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
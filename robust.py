@@ -0,0 +1,212 @@
+import numpy as np
+
+from problem import compile_problem
+from troops_config import DEFAULT_PROFILE, load_profile
+from troops_optimizer import run_simulated_annealing
+from warm_start import exchange_lines
+
+# Risk measures robust_optimize can minimise
+RISKS = ("expected", "cvar")
+
+# Relative standard deviation of each animal count between scouting and arrival
+DEFAULT_DRIFT = 0.1
+
+# Expected animals of each present species that spawn before arrival
+DEFAULT_SPAWN_RATE = 0.5
+
+# Army-scenario pairs scored per NumPy call, bounds memory at a few dozen MB
+CELL_CHUNK = 1 << 20
+
+# Rounds of line scans and exchanges before settling on the best army found
+ROBUST_ROUNDS = 6
+
+# Candidates of a round are first ranked on this many scenarios, the best SCREEN_KEEP of them on all
+SCREEN_SCENARIOS = 256
+SCREEN_KEEP = 64
+
+def sample_scenarios(oasis_composition: dict,
+                     scenarios: int,
+                     drift: float = DEFAULT_DRIFT,
+                     spawn_rate: float = DEFAULT_SPAWN_RATE,
+                     seed: int = 42,
+                     profile: str = DEFAULT_PROFILE):
+    """
+    Oasis defenses an army may meet on arrival, sampled around the scouted composition
+
+    Each scouted count n drifts to max(0, round(n * (1 + drift * Z))) with Z standard normal,
+    and every species present gains Poisson(spawn_rate) newly spawned animals. All scenarios
+    are drawn as one (scenarios, animals) matrix and turned into defense with one product.
+
+    Parameters:
+    - oasis_composition: scouted dict of animal name to count
+    - scenarios: number of samples
+    - drift: relative standard deviation of each count
+    - spawn_rate: expected spawned animals per present species
+    - seed: random seed, the same seed gives the same scenarios
+    - profile: server profile of the animal stats
+
+    Returns (inf_def, cav_def), two float arrays of length scenarios
+    """
+
+    stats = load_profile(profile)
+    scouted = np.zeros(len(stats.animal_ids))
+    for animal, count in oasis_composition.items():
+        if animal in stats.animal_ids:
+            scouted[stats.animal_ids[animal]] = count
+
+    rng = np.random.default_rng(seed)
+    counts = np.maximum(0.0, np.rint(scouted * (1 + drift * rng.standard_normal((scenarios, len(scouted))))))
+    counts += rng.poisson(spawn_rate * (scouted > 0), size=counts.shape)
+
+    defense = counts @ stats.oasis_defense
+    return defense[:, 0], defense[:, 1]
+
+def scenario_loss_costs(problem, armies, inf_def, cav_def):
+    """
+    Resource loss of every army in every scenario, the loss_function terms broadcast over an
+    (armies, scenarios) grid in chunks of CELL_CHUNK cells
+
+    Returns an (N, S) float array, inf for empty armies
+    """
+
+    armies = np.asarray(armies, dtype=float).reshape(-1, len(problem.troops))
+    inf_pow = armies[:, ~problem.is_cavalry] @ problem.attack[~problem.is_cavalry]
+    cav_pow = armies[:, problem.is_cavalry] @ problem.attack[problem.is_cavalry]
+    total_pow = inf_pow + cav_pow
+    costs = np.empty((len(armies), len(inf_def)))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inf_ratio = np.where(total_pow > 0, inf_pow / total_pow, 0.0)
+        cav_ratio = np.where(total_pow > 0, cav_pow / total_pow, 0.0)
+        rows = max(1, CELL_CHUNK // max(1, len(inf_def) * len(problem.troops)))
+        for first in range(0, len(armies), rows):
+            block = slice(first, first + rows)
+            effective_defense = inf_ratio[block, None] * inf_def[None, :] + cav_ratio[block, None] * cav_def[None, :]
+            loss_share = (effective_defense / total_pow[block, None]) ** 1.5
+            losses = np.rint(armies[block, None, :] * loss_share[:, :, None])
+            costs[block] = losses @ problem.cost
+    costs[total_pow == 0] = np.inf
+    return costs
+
+def risk_of(costs, risk: str = "expected", alpha: float = 0.1):
+    """
+    Expected loss cost per army, or its CVaR: the mean over the worst alpha share of scenarios
+
+    Returns an (N,) float array
+    """
+
+    if risk == "expected":
+        return costs.mean(axis=1)
+    tail = max(1, int(np.ceil(alpha * costs.shape[1])))
+    return np.partition(costs, costs.shape[1] - tail, axis=1)[:, -tail:].mean(axis=1)
+
+def robust_scores(problem, armies, inf_def, cav_def, risk: str = "expected", alpha: float = 0.1):
+    """Risk of the loss cost plus the army-size penalty, inf for empty or over-limit armies"""
+
+    armies = np.asarray(armies).reshape(-1, len(problem.troops))
+    weights = np.where(problem.is_cavalry, problem.cavalry_penalty_coefficient, 1.0)
+    scores = risk_of(scenario_loss_costs(problem, armies, inf_def, cav_def), risk, alpha)
+    scores = scores + (armies @ weights) * problem.army_size_penalty_coefficient
+    scores[(armies > np.array(problem.limits)).any(axis=1)] = np.inf
+    return scores
+
+def robust_optimize(tribe: str,
+                    troops: list,
+                    troop_levels: dict,
+                    oasis_composition: dict,
+                    max_troop_limit: dict,
+                    army_size_penalty_coefficient: float = 3.0,
+                    cavalry_penalty_coefficient: float = 10.0,
+                    scenarios: int = 2000,
+                    drift: float = DEFAULT_DRIFT,
+                    spawn_rate: float = DEFAULT_SPAWN_RATE,
+                    risk: str = "expected",
+                    alpha: float = 0.1,
+                    seed: int = 42,
+                    profile: str = DEFAULT_PROFILE,
+                    modifiers: dict = None):
+    """
+    Army minimising the expected or worst-case (CVaR) loss cost over sampled arrival
+    scenarios, plus the usual army-size penalty
+
+    Starts from the deterministic optimum against the scouted oasis (run_simulated_annealing
+    with the "auto" engine, exact for small armies), then scans every count of each troop and
+    the equal-power exchange lines of every troop pair until a round finds nothing better. Each round ranks its candidates in one NumPy pass
+    over the first SCREEN_SCENARIOS scenarios and scores the SCREEN_KEEP best against all of
+    them, so moves are only ever accepted on the full sample.
+
+    Parameters:
+    - tribe, troops, troop_levels, oasis_composition, max_troop_limit, coefficients, profile,
+      modifiers: as in run_simulated_annealing
+    - scenarios, drift, spawn_rate, seed: see sample_scenarios
+    - risk: "expected" for the mean loss cost, "cvar" for the mean of the worst alpha share
+    - alpha: tail share for "cvar"
+
+    Returns a dict with best_counts, objective_score (risk plus penalty), risk, alpha,
+    scenarios, expected_loss_cost, cvar_loss_cost, loss_cost_quantiles of the chosen army, and
+    deterministic: the scouted-oasis optimum with the same statistics for comparison
+    """
+
+    if risk not in RISKS:
+        raise ValueError(f"Unknown risk: {risk}")
+    if not 0 < alpha <= 1:
+        raise ValueError(f"alpha must be in (0, 1], got {alpha}")
+
+    problem = compile_problem(tribe, troops, troop_levels, oasis_composition, max_troop_limit,
+                              army_size_penalty_coefficient, cavalry_penalty_coefficient, profile, modifiers)
+    caps = np.array([max(0, int(limit)) for limit in problem.limits])
+    inf_def, cav_def = sample_scenarios(oasis_composition, scenarios, drift, spawn_rate, seed, profile)
+
+    def score(armies, sample=slice(None)):
+        return robust_scores(problem, armies, inf_def[sample], cav_def[sample], risk, alpha)
+
+    # Step 1: Deterministic optimum as the starting army, from the engine /optimize would pick
+    deterministic_counts = run_simulated_annealing(
+        tribe=tribe,
+        troops=troops,
+        troop_levels=troop_levels,
+        oasis_composition=oasis_composition,
+        max_troop_limit=max_troop_limit,
+        army_size_penalty_coefficient=army_size_penalty_coefficient,
+        cavalry_penalty_coefficient=cavalry_penalty_coefficient,
+        engine="auto",
+        profile=profile,
+        modifiers=modifiers
+    )["best_counts"]
+    army = np.array([deterministic_counts[troop] for troop in troops], dtype=np.int64)
+    best_score = float(score(army)[0])
+
+    # Step 2: Line scans and equal-power exchanges under the robust objective
+    for _ in range(ROBUST_ROUNDS):
+        start_score = best_score
+        blocks = []
+        for i in range(len(troops)):
+            line = np.tile(army, (caps[i] + 1, 1))
+            line[:, i] = np.arange(caps[i] + 1)
+            blocks.append(line)
+        blocks.append(exchange_lines(problem, army, caps))
+        candidates = np.unique(np.concatenate(blocks), axis=0)
+        if len(candidates) > SCREEN_KEEP and scenarios > SCREEN_SCENARIOS:
+            screened = score(candidates, slice(SCREEN_SCENARIOS))
+            candidates = candidates[np.argsort(screened, kind="stable")[:SCREEN_KEEP]]
+        scores = score(candidates)
+        best = int(np.argmin(scores))
+        if scores[best] < best_score:
+            army, best_score = candidates[best], float(scores[best])
+        if best_score >= start_score:
+            break
+
+    def summary(counts):
+        costs = scenario_loss_costs(problem, counts[None, :], inf_def, cav_def)
+        return {
+            "best_counts": {troop: int(count) for troop, count in zip(troops, counts)},
+            "objective_score": float(score(counts)[0]),
+            "expected_loss_cost": float(risk_of(costs, "expected")[0]),
+            "cvar_loss_cost": float(risk_of(costs, "cvar", alpha)[0]),
+            "loss_cost_quantiles": {f"p{q}": float(np.percentile(costs[0], q)) for q in (50, 90, 99)}
+        }
+
+    result = summary(army)
+    result.update(risk=risk, alpha=alpha, scenarios=scenarios)
+    result["deterministic"] = summary(np.array([deterministic_counts[troop] for troop in troops]))
+    return result
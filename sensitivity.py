@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+
+import worker_pool
+from exact_solver import solve_problem
+from problem import compile_problem
+from troops_config import DEFAULT_PROFILE, load_profile
+
+def level_variants(tribe: str, troops: list, troop_levels: dict, profile: str = DEFAULT_PROFILE):
+    """
+    The base levels followed by every one-level move of one troop that stays within the profile
+
+    Returns a list of (troop, delta, levels), troop and delta None for the base levels
+    """
+
+    stats = load_profile(profile)
+    base = {troop: troop_levels.get(troop, 1) for troop in troops}
+    variants = [(None, None, base)]
+    for troop in troops:
+        top = int(stats.levels[stats.troop_ids[tribe][troop]])
+        for delta in (1, -1):
+            if 1 <= base[troop] + delta <= top:
+                variants.append((troop, delta, {**base, troop: base[troop] + delta}))
+    return variants
+
+def _oasis_sensitivity(args):
+    """
+    Worker entry point, exact optima of one oasis under every level variant
+
+    Variants differ in one attack value, so their optima lie close together: each variant's
+    branch and bound starts from every optimum found so far, scored in one batch.
+
+    Returns (scores, armies, stopped), one row per variant, stopped True when the deadline cut
+    a search short
+    """
+
+    tribe, troops, variants, oasis_composition, max_troop_limit, army_coeff, cav_coeff, profile, modifiers, deadline = args
+    scores, armies, stopped = [], np.zeros((0, len(troops)), dtype=np.int64), False
+    for _, _, levels in variants:
+        problem = compile_problem(tribe, troops, levels, oasis_composition, max_troop_limit,
+                                  army_coeff, cav_coeff, profile, modifiers)
+        stats = {}
+        counts, score = solve_problem(problem, stats=stats, deadline=deadline, seeds=armies)
+        stopped = stopped or stats["stopped"]
+        scores.append(score)
+        armies = np.vstack([armies, [[counts[troop] for troop in troops]]])
+    return np.array(scores), armies, stopped
+
+def level_sensitivity(tribe: str,
+                      troops: list,
+                      troop_levels: dict,
+                      oasis_compositions: list,
+                      max_troop_limit: dict,
+                      army_size_penalty_coefficient: float = 3.0,
+                      cavalry_penalty_coefficient: float = 10.0,
+                      profile: str = DEFAULT_PROFILE,
+                      modifiers: dict = None,
+                      time_budget_ms: float = None):
+    """
+    How the total optimal objective over a set of oases moves when one troop's level moves by
+    one, answering which smithy upgrade is worth most
+
+    Every (oasis, variant) pair is solved exactly, oases are spread over the process pool.
+
+    Parameters:
+    - tribe, troops, troop_levels, max_troop_limit, coefficients, profile, modifiers: as in
+      run_simulated_annealing
+    - oasis_compositions: list of dicts of animal name to count, the farm list to judge by
+    - time_budget_ms: optional wall-time budget of the whole report, searches still running
+      when it runs out return their best army so far
+
+    Returns a dict with base_objective, the summed optimum at the current levels, converged
+    (False when the budget cut a search short, the gains are then estimates), and troops,
+    one entry per troop ranked by upgrade gain (largest first, troops at their top level last):
+    {"troop", "level", "upgrade", "downgrade"}, each move None when out of range or else
+    {"level", "objective", "gain", "best_counts"}; gain is how much the summed objective drops,
+    best_counts the optimal army per oasis at that level
+    """
+
+    # time.monotonic is system-wide on Linux, pool workers share the caller's deadline
+    deadline = time.monotonic() + time_budget_ms / 1000 if time_budget_ms is not None else None
+    variants = level_variants(tribe, troops, troop_levels, profile)
+    tasks = [
+        (tribe, troops, variants, oasis, max_troop_limit, army_size_penalty_coefficient,
+         cavalry_penalty_coefficient, profile, modifiers, deadline)
+        for oasis in oasis_compositions
+    ]
+
+    if len(tasks) > 1 and worker_pool.MAX_WORKERS > 1:
+        solved = worker_pool.get_pool().map(_oasis_sensitivity, tasks, chunksize=worker_pool.chunksize_for(len(tasks)))
+    else:
+        solved = map(_oasis_sensitivity, tasks)
+
+    # (oases, variants) objective grid and (oases, variants, k) armies
+    scores, armies = np.zeros((0, len(variants))), np.zeros((0, len(variants), len(troops)), dtype=np.int64)
+    converged = True
+    for oasis_scores, oasis_armies, stopped in solved:
+        scores = np.vstack([scores, oasis_scores[None, :]])
+        armies = np.concatenate([armies, oasis_armies[None]])
+        converged = converged and not stopped
+    totals = scores.sum(axis=0)
+
+    report = {troop: {"troop": troop, "level": variants[0][2][troop], "upgrade": None, "downgrade": None} for troop in troops}
+    for column, (troop, delta, levels) in enumerate(variants[1:], start=1):
+        report[troop]["upgrade" if delta > 0 else "downgrade"] = {
+            "level": levels[troop],
+            "objective": float(totals[column]),
+            "gain": float(totals[0] - totals[column]),
+            "best_counts": [dict(zip(troops, (int(count) for count in army))) for army in armies[:, column]]
+        }
+
+    ranked = sorted(report.values(), key=lambda entry: -entry["upgrade"]["gain"] if entry["upgrade"] else np.inf)
+    return {"base_objective": float(totals[0]), "converged": converged, "troops": ranked}
@@ -0,0 +1,187 @@
+"""
+Offline sweep of one army configuration over every oasis of a map export.
+
+Oases are streamed from CSV or Parquet in fixed-size chunks, each chunk is optimized over the
+process pool and written as one Parquet part of the output directory, so memory stays flat
+for any input size. A rerun with the same arguments resumes after the last finished part.
+
+The input holds one column per animal, named as in the server profile, with its count; empty
+cells count as zero and every other column (coordinates, ids) is copied to the output. The
+output directory reads as one table with pyarrow.parquet.read_table and holds those columns
+plus best_counts and troop_losses (one field per troop), loss_percent and total_loss_cost.
+
+Usage: python sweep.py config.json oases.csv|oases.parquet output_dir [--chunk-rows N] [--workers N]
+where config holds tribe, troops, troop_levels, max_troop_limit, army_coeff, cav_coeff and
+optionally engine and profile
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+import worker_pool
+from batch_optimizer import iter_farm_list
+from result_cache import PersistentStore, ResultCache
+from troops_config import DEFAULT_PROFILE, load_profile
+
+# Oases per output part, also the resume granularity
+DEFAULT_CHUNK_ROWS = 5000
+
+# Written next to the parts, a resume must match it
+MANIFEST = "_sweep.json"
+
+def read_chunks(path: str, chunk_rows: int):
+    """
+    Yields the rows of a CSV or Parquet file as pyarrow Tables of exactly chunk_rows rows,
+    the last one shorter. At most one chunk and one input block are held at a time.
+    """
+
+    if path.endswith(".parquet"):
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+    else:
+        batches = pa_csv.open_csv(path)
+
+    pending, rows = [], 0
+    for batch in batches:
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= chunk_rows:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_rows)
+            rest = table.slice(chunk_rows)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(pending)
+
+def oasis_compositions(table, animals):
+    """One dict of animal name to count per row, from the animal columns of a chunk"""
+
+    columns = {
+        animal: table.column(animal).fill_null(0).to_numpy().astype(np.int64)
+        for animal in animals if animal in table.column_names
+    }
+    return [
+        {animal: int(counts[row]) for animal, counts in columns.items() if counts[row]}
+        for row in range(table.num_rows)
+    ]
+
+def solve_chunk(config: dict, table, animals, cache):
+    """
+    Optimizes every row of a chunk
+
+    Returns the chunk's non-animal columns plus the result columns as a pyarrow Table
+    """
+
+    troops = config["troops"]
+    best_counts = np.zeros((table.num_rows, len(troops)), dtype=np.int64)
+    troop_losses = np.zeros((table.num_rows, len(troops)), dtype=np.int64)
+    loss_percent = np.zeros(table.num_rows)
+    total_loss_cost = np.zeros(table.num_rows, dtype=np.int64)
+
+    for item in iter_farm_list(
+        tribe=config["tribe"],
+        troops=troops,
+        troop_levels=config["troop_levels"],
+        oasis_compositions=oasis_compositions(table, animals),
+        max_troop_limit=config["max_troop_limit"],
+        army_size_penalty_coefficient=config["army_coeff"],
+        cavalry_penalty_coefficient=config["cav_coeff"],
+        engine=config.get("engine", "auto"),
+        cache=cache,
+        profile=config.get("profile", DEFAULT_PROFILE)
+    ):
+        row, result = item["index"], item["result"]
+        best_counts[row] = [result["best_counts"][troop] for troop in troops]
+        troop_losses[row] = [result["troop_losses"][troop] for troop in troops]
+        loss_percent[row] = result["loss_percent"]
+        total_loss_cost[row] = result["total_loss_cost"]
+
+    output = table.drop_columns([animal for animal in animals if animal in table.column_names])
+    for name, values in (("best_counts", best_counts), ("troop_losses", troop_losses)):
+        output = output.append_column(name, pa.StructArray.from_arrays(list(values.T), names=troops))
+    output = output.append_column("loss_percent", pa.array(loss_percent))
+    return output.append_column("total_loss_cost", pa.array(total_loss_cost))
+
+def open_output(output_dir: str, manifest: dict):
+    """Creates the output directory, or checks that an existing one was started with the same arguments"""
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise SystemExit(f"{output_dir} holds a sweep with other arguments, use a new output directory")
+        return
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+def sweep(config: dict, input_path: str, output_dir: str, chunk_rows: int = DEFAULT_CHUNK_ROWS, cache=None):
+    """
+    Runs the sweep, skipping parts a previous run finished
+
+    Returns {"rows", "solved_rows", "skipped_chunks", "total_ms"}
+    """
+
+    start = time.perf_counter()
+    animals = list(load_profile(config.get("profile", DEFAULT_PROFILE)).animal_ids)
+    with open(input_path, "rb") as f:
+        input_digest = hashlib.blake2b(f.read(1 << 20), digest_size=16).hexdigest()
+    open_output(output_dir, {
+        "config": config,
+        "input": os.path.abspath(input_path),
+        "input_size": os.path.getsize(input_path),
+        "input_head_digest": input_digest,
+        "chunk_rows": chunk_rows
+    })
+
+    cache = cache if cache is not None else ResultCache()
+    stats = {"rows": 0, "solved_rows": 0, "skipped_chunks": 0}
+    for chunk, table in enumerate(read_chunks(input_path, chunk_rows)):
+        stats["rows"] += table.num_rows
+        part = os.path.join(output_dir, f"part-{chunk:06d}.parquet")
+        if os.path.exists(part):
+            stats["skipped_chunks"] += 1
+            continue
+
+        chunk_start = time.perf_counter()
+        output = solve_chunk(config, table, animals, cache)
+        # Parts appear only once complete, an interrupted chunk is solved again on resume
+        temporary = os.path.join(output_dir, f".part-{chunk:06d}.tmp")
+        pq.write_table(output, temporary)
+        os.replace(temporary, part)
+        stats["solved_rows"] += table.num_rows
+        print(f"chunk {chunk}: {table.num_rows} rows in {(time.perf_counter() - chunk_start) * 1000:.0f} ms",
+              file=sys.stderr)
+
+    stats["total_ms"] = (time.perf_counter() - start) * 1000
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize one army against every oasis of a CSV or Parquet file")
+    parser.add_argument("config", help="JSON with tribe, troops, troop_levels, max_troop_limit, army_coeff, cav_coeff")
+    parser.add_argument("input", help="CSV or .parquet file, one oasis per row, one column per animal")
+    parser.add_argument("output", help="directory receiving the Parquet parts")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="oases per part")
+    parser.add_argument("--workers", type=int, default=worker_pool.MAX_WORKERS, help="optimizer processes")
+    parser.add_argument("--persistent-cache", action="store_true",
+                        help="share results with the API through its on-disk result store")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    worker_pool.MAX_WORKERS = args.workers
+    cache = ResultCache(store=PersistentStore()) if args.persistent_cache else None
+
+    print(json.dumps(sweep(config, args.input, args.output, args.chunk_rows, cache)))
+
+if __name__ == "__main__":
+    main()
@@ -1,123 +1,199 @@
-OASIS_DEFENSE = {
-    "Rat": (25, 20),
-    "Spider": (35, 40),
-    "Snake": (40, 60),
-    "Bat": (66, 50),
-    "Boar": (70, 33),
-    "Wolf": (80, 70),
-    "Bear": (140, 200),
-    "Crocodile": (380, 240),
-    "Tiger": (170, 250),
-    "Elephant": (440, 520)
-}
-
-TROOPS_TABLE = {
-    "Teuton": {
-        "Clubswinger": {
-            "type": "infantry",
-            "attack": [
-                40.0, 40.6, 41.2, 41.8, 42.5, 43.1, 43.7, 44.4, 45.1, 45.7,
-                46.4, 47.1, 47.8, 48.5, 49.3, 50.0, 50.8, 51.5, 52.83, 53.1, 53.9
-            ],
-            "cost": 250
-        },
-        "Axeman": {
-            "type": "infantry",
-            "attack": [
-                60.0, 60.9, 61.8, 62.7, 63.7, 64.6, 65.6, 66.6, 67.6, 68.6, 
-                69.6, 70.7, 71.7, 72.8, 73.9, 75.0, 76.1, 77.3, 78.4, 79.6, 80.8
-            ],
-            "cost": 490
-        },
-        "Teutonic_Knight": {
-            "type": "cavalry",
-            "attack": [
-                150.0, 152.2, 154.5, 156.9, 159.2, 161.6, 164.0, 166.5, 169.0, 171.5, 
-                174.1, 176.7, 179.3, 182.0, 184.8, 187.5, 190.3, 193.2, 196.1, 199.0, 202.0
-            ],
-            "cost": 1525
-        }
-    },
-    "Roman": {
-        "Legionnaire": {
-            "type": "infantry",
-            "attack": [
-                40.0, 40.6, 41.2, 41.8, 42.5, 43.1, 43.7, 44.4, 45.1, 45.7, 
-                46.4, 47.1, 47.8, 48.5, 49.3, 50.0, 50.8, 51.5, 52.3, 53.1, 53.9
-            ],
-            "cost": 400
-        },
-        "Imperian": {
-            "type": "infantry",
-            "attack": [
-                70.0, 71.1, 72.1, 73.2, 74.3, 75.4, 76.5, 77.7, 78.9, 80.0, 
-                81.2, 82.5, 83.7, 84.9, 86.2, 87.5, 88.8, 90.2, 91.5, 92.9, 94.3
-            ],
-            "cost": 600
-        },
-        "Equites_Imperatoris": {
-            "type": "cavalry",
-            "attack": [
-                120.0, 121.8, 123.6, 125.5, 127.4, 129.3, 131.2, 133.2, 135.2, 137.2, 
-                139.3, 141.4, 143.5, 145.6, 147.8, 150.0, 152.3, 154.6, 156.9, 159.2, 161.6
-            ],
-            "cost": 1410
-        },
-        "Equites_Caesaris": {
-            "type": "cavalry",
-            "attack": [
-                180.0, 182.7, 185.4, 188.2, 191.0, 193.9, 196.8, 199.8, 202.8, 205.8, 
-                208.9, 212.0, 215.2, 218.4, 221.7, 225.0, 228.4, 231.8, 235.3, 238.9, 242.4
-            ],
-            "cost": 2170
-        }
-    },
-    "Gaul": {
-        "Swordman": {
-            "type": "infantry",
-            "attack": [
-                65, 66.0, 67.0, 68.0, 69.0, 70.0, 71.1, 72.1, 73.2, 74.3, 
-                75.4, 76.6, 77.7, 78.9, 80.1, 81.3, 82.5, 83.7, 85.0, 87.5
-            ],
-            "cost": 535
-        },
-        "Theutates_Thunder": {
-            "type": "cavalry",
-            "attack": [
-                90.0, 91.4, 92.7, 94.1, 95.5, 97.0, 99.9, 101.4, 102.9, 104.4, 
-                106.0, 107.6, 109.2, 110.9, 112.5, 114.2, 115.9, 117.7, 119.4, 121.2
-            ],
-            "cost": 1090
-        }
-    }
-}
-
-def compute_offense_split(tribe: str, troop_levels: dict, troop_counts: dict):
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from modifiers import modified_attack
+
+# Versioned game-server profiles, one JSON file per profile named after it
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+# Profile used when a request does not name one
+DEFAULT_PROFILE = "default"
+
+TROOP_TYPES = ("infantry", "cavalry")
+
+class ProfileError(ValueError):
+    pass
+
+class ServerProfile(NamedTuple):
+    """
+    Stats of one game-server type, indexed for O(1) lookups.
+
+    Fields:
+    - name, version, description: as in the profile file
+    - digest: hash of the file's bytes, changes with any edit so cached results can tell stale stats apart
+    - troop_ids: tribe -> troop name -> row of the per-troop arrays
+    - attack: (troops, levels) array, row r holds levels 1..levels[r] in its first columns, NaN after
+    - attack_rows: the same rows as tuples of Python numbers for the scalar paths
+    - levels, cost, is_cavalry: per-troop level count, unit cost and cavalry flag arrays
+    - cavalry_rows: is_cavalry as a tuple of bools
+    - animal_ids, oasis_defense: animal -> row of the (animals, 2) infantry / cavalry defense array
+    - troops_table, oasis_table: the profile as nested dicts, shaped like TROOPS_TABLE and OASIS_DEFENSE
+    """
+
+    name: str
+    version: int
+    description: str
+    digest: str
+    troop_ids: dict
+    attack: np.ndarray
+    attack_rows: tuple
+    levels: np.ndarray
+    cost: np.ndarray
+    is_cavalry: np.ndarray
+    cavalry_rows: tuple
+    animal_ids: dict
+    oasis_defense: np.ndarray
+    troops_table: dict
+    oasis_table: dict
+
+def _check(condition, name, message):
+    if not condition:
+        raise ProfileError(f"Server profile '{name}': {message}")
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_profile(data: dict, name: str):
+    """
+    Checks the shape of a parsed profile file, raising ProfileError on the first problem
+
+    Every tribe declares its level count in "levels" and every troop of it must list exactly
+    that many attack values, never decreasing, next to a type of TROOP_TYPES and a positive
+    whole cost. Every animal has a non-negative (infantry, cavalry) defense pair.
+    """
+
+    for key in ("name", "version", "levels", "oasis_defense", "tribes"):
+        _check(key in data, name, f"missing '{key}'")
+    _check(data["name"] == name, name, f"file declares name '{data['name']}'")
+    _check(set(data["levels"]) == set(data["tribes"]), name, "'levels' and 'tribes' name different tribes")
+
+    for tribe, troops in data["tribes"].items():
+        levels = data["levels"][tribe]
+        _check(isinstance(levels, int) and levels > 0, name, f"{tribe} level count must be a positive integer")
+        _check(len(troops) > 0, name, f"{tribe} has no troops")
+        for troop, stats in troops.items():
+            where = f"{tribe} {troop}"
+            _check(stats.get("type") in TROOP_TYPES, name, f"{where} type must be one of {', '.join(TROOP_TYPES)}")
+            _check(_is_number(stats.get("cost")) and stats["cost"] > 0 and stats["cost"] == int(stats["cost"]), name,
+                   f"{where} cost must be a positive whole number")
+            attack = stats.get("attack")
+            _check(isinstance(attack, list) and len(attack) == levels, name,
+                   f"{where} has {len(attack) if isinstance(attack, list) else 0} attack levels, {tribe} declares {levels}")
+            _check(all(_is_number(value) and value > 0 for value in attack), name, f"{where} attack values must be positive numbers")
+            _check(all(low <= high for low, high in zip(attack, attack[1:])), name, f"{where} attack decreases with level")
+
+    _check(len(data["oasis_defense"]) > 0, name, "no animals in 'oasis_defense'")
+    for animal, defense in data["oasis_defense"].items():
+        _check(isinstance(defense, list) and len(defense) == 2 and all(_is_number(value) and value >= 0 for value in defense),
+               name, f"{animal} defense must be a pair of non-negative numbers")
+
+def list_profiles():
+    """
+    Profiles available in PROFILE_DIR
+
+    Returns a list of {"name", "version", "description"} sorted by name
+    """
+
+    names = sorted(file[:-len(".json")] for file in os.listdir(PROFILE_DIR) if file.endswith(".json"))
+    return [
+        {"name": profile.name, "version": profile.version, "description": profile.description}
+        for profile in map(load_profile, names)
+    ]
+
+@lru_cache(maxsize=None)
+def load_profile(name: str = DEFAULT_PROFILE):
+    """
+    Loads, validates and indexes PROFILE_DIR/<name>.json once per process
+
+    Parameters:
+    - name: profile name, e.g., "default"
+
+    Returns ServerProfile, raises ProfileError for unknown or malformed profiles
+    """
+
+    path = os.path.join(PROFILE_DIR, f"{name}.json")
+    if os.path.basename(name) != name or not os.path.isfile(path):
+        raise ProfileError(f"Unknown server profile: {name}")
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = json.loads(raw)
+    validate_profile(data, name)
+
+    troop_ids, rows = {}, []
+    for tribe, troops in data["tribes"].items():
+        troop_ids[tribe] = {}
+        for troop, stats in troops.items():
+            troop_ids[tribe][troop] = len(rows)
+            rows.append(stats)
+
+    levels = np.array([len(stats["attack"]) for stats in rows])
+    attack = np.full((len(rows), levels.max()), np.nan)
+    for row, stats in enumerate(rows):
+        attack[row, :levels[row]] = stats["attack"]
+    cost = np.array([stats["cost"] for stats in rows], dtype=float)
+    is_cavalry = np.array([stats["type"] == "cavalry" for stats in rows], dtype=bool)
+    oasis_table = {animal: tuple(defense) for animal, defense in data["oasis_defense"].items()}
+
+    # Shared by every caller, so keep them immutable
+    for array in (attack, levels, cost, is_cavalry):
+        array.setflags(write=False)
+
+    return ServerProfile(
+        name=name,
+        version=data["version"],
+        description=data.get("description", ""),
+        digest=hashlib.blake2b(raw, digest_size=16).hexdigest(),
+        troop_ids=troop_ids,
+        attack=attack,
+        attack_rows=tuple(tuple(stats["attack"]) for stats in rows),
+        levels=levels,
+        cost=cost,
+        is_cavalry=is_cavalry,
+        cavalry_rows=tuple(is_cavalry.tolist()),
+        animal_ids={animal: row for row, animal in enumerate(oasis_table)},
+        oasis_defense=np.array(list(oasis_table.values()), dtype=float),
+        troops_table=data["tribes"],
+        oasis_table=oasis_table
+    )
+
+# Stats of the default profile under their historical names
+OASIS_DEFENSE = load_profile().oasis_table
+TROOPS_TABLE = load_profile().troops_table
+
+def compute_offense_split(tribe: str, troop_levels: dict, troop_counts: dict, profile: str = DEFAULT_PROFILE,
+                          modifiers: dict = None):
     """
     Parameters:
     - tribe: e.g., "Teuton"
     - troop_levels: dict, e.g., {"Clubswinger": 12, "Teutonic_Knight": 10}
     - troop_counts: dict, e.g., {"Clubswinger": 300, "Teutonic_Knight": 10}
+    - profile: server profile name
+    - modifiers: optional attack bonuses, see modifiers.apply_modifiers
 
     Returns (infantry_power, cavalry_power, infantry_power_ratio, cavalry_power_ratio, total_power)
     """
 
     inf_pow, cav_pow = 0.0, 0.0
     inf_pow_ratio, cav_pow_ratio = 0.0, 0.0
-    tribe_data = TROOPS_TABLE[tribe]
+    stats = load_profile(profile)
+    troop_ids = stats.troop_ids[tribe]
 
     for troop, count in troop_counts.items():
-        level = troop_levels.get(troop, 1)
-        data = tribe_data.get(troop)
+        row = troop_ids.get(troop)
 
-        if not data:
+        if row is None:
             continue
 
-        atk = data["attack"][level - 1]
-        if data["type"] == "infantry":
-            inf_pow += count * atk
-        elif data["type"] == "cavalry":
+        atk = modified_attack(troop, stats.attack_rows[row][troop_levels.get(troop, 1) - 1], modifiers)
+        if stats.cavalry_rows[row]:
             cav_pow += count * atk
+        else:
+            inf_pow += count * atk
 
     total_pow = inf_pow + cav_pow
 
@@ -129,10 +205,33 @@ def compute_offense_split(tribe: str, troop_levels: dict, troop_counts: dict):
 
     return inf_pow, cav_pow, inf_pow_ratio, cav_pow_ratio, total_pow
 
+def compute_oasis_defense(oasis_composition, profile: str = DEFAULT_PROFILE):
+    """
+    Computes oasis power
+
+    Parameters:
+    - oasis_composition: dict of animal name to count, e.g., {"Rat": 12, "Spider": 10}
+    - profile: server profile name
+
+    Returns (total_def_infantry, total_def_cavalry)
+    """
+
+    oasis_table = load_profile(profile).oasis_table
+    inf_def, cav_def = 0, 0
+    for animal, count in oasis_composition.items():
+        if animal not in oasis_table:
+            continue
+
+        i_d, c_d = oasis_table[animal]
+        inf_def += i_d * count
+        cav_def += c_d * count
+
+    return inf_def, cav_def
+
 # # Test, uncommand to test
 # levels = {"Clubswinger": 12, "Teutonic_Knight": 10}
 # counts = {"Clubswinger": 200, "Teutonic_Knight": 10}
 
 # res = compute_offense_split("Teuton", levels, counts)
 
-# print("Inf:", res[0], "Cav:", res[1], "Ratios:", res[2], res[3], "Total:", res[4])
\ No newline at end of file
+# print("Inf:", res[0], "Cav:", res[1], "Ratios:", res[2], res[3], "Total:", res[4])
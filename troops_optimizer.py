@@ -1,31 +1,29 @@
-from scipy.optimize import dual_annealing
-from troops_config import OASIS_DEFENSE, TROOPS_TABLE, compute_offense_split
-
-def compute_oasis_defense(oasis_composition):
-    """
-    Computes oasis power
-
-    Parameters:
-    - oasis_composition: dict of animal name to count, e.g., {"Rat": 12, "Spider": 10}
-
-    Returns (total_def_infantry, total_def_cavalry)
-    """
-
-    inf_def, cav_def = 0, 0
-    for animal, count in oasis_composition.items():
-        if animal not in OASIS_DEFENSE:
-            continue
-
-        i_d, c_d = OASIS_DEFENSE[animal]
-        inf_def += i_d * count
-        cav_def += c_d * count
-
-    return inf_def, cav_def
+import math
+import multiprocessing
+import statistics
+import time
+from concurrent.futures import as_completed
+
+import worker_pool
+from troops_config import DEFAULT_PROFILE, compute_offense_split, compute_oasis_defense, load_profile
+from exact_solver import solve_problem
+from lookup_table import lookup_army
+from modifiers import has_effect
+from problem import compile_problem
+from warm_start import reoptimize
+
+ENGINES = ("auto", "annealing", "exact", "table")
+
+# The "auto" engine sends armies of at most this many troops to the exact engine, a closed
+# form for one troop and a millisecond branch-and-bound search for two
+EXACT_DISPATCH_TROOPS = 2
 
 def count_loss_percentage(tribe: str,
                           troop_counts: dict,
                           troop_levels: dict,
-                          oasis_composition: dict) -> int:
+                          oasis_composition: dict,
+                          profile: str = DEFAULT_PROFILE,
+                          modifiers: dict = None) -> int:
     """
     Computes rounded-down loss percentage for given army vs oasis.
 
@@ -34,20 +32,22 @@ def count_loss_percentage(tribe: str,
     - troop_counts: dict, e.g., {"Clubswinger": 300, "Teutonic_Knight": 10}
     - troop_levels: dict, e.g., {"Clubswinger": 12, "Teutonic_Knight": 10}
     - oasis_composition: dict of animal name to count, e.g., {"Rat": 12, "Spider": 10}
+    - profile: server profile name
+    - modifiers: optional attack bonuses, see modifiers.apply_modifiers
 
     Returns:
     - Integer loss percentage (rounded down), or float("inf") if invalid
     """
     # 1. Compute offense power
     inf_pow, cav_pow, inf_pow_ratio, cav_pow_ratio, total_pow = compute_offense_split(
-        tribe, troop_levels, troop_counts
+        tribe, troop_levels, troop_counts, profile, modifiers
     )
 
     if total_pow == 0:
         return float("inf")
 
     # 2. Compute oasis defense
-    inf_def, cav_def = compute_oasis_defense(oasis_composition)
+    inf_def, cav_def = compute_oasis_defense(oasis_composition, profile)
 
     # 3. Defense against offense ratio
     effective_defense = inf_def * inf_pow_ratio + cav_def * cav_pow_ratio
@@ -63,7 +63,9 @@ def loss_function(tribe: str,
                   oasis_composition: dict,
                   army_size_penalty_coefficient: float = 5.0,
                   cavalry_penalty_coefficient: float = 2.5,
-                  max_troop_limit: dict = None):
+                  max_troop_limit: dict = None,
+                  profile: str = DEFAULT_PROFILE,
+                  modifiers: dict = None):
     """
     Loss function to minimize.
 
@@ -75,11 +77,15 @@ def loss_function(tribe: str,
     - army_size_penalty_coefficient: penalty per army size
     - cavalry_penalty_coefficient: penalty per cavalry unit
     - max_troop_limit: optional upper bound for each troop
+    - profile: server profile name
+    - modifiers: optional attack bonuses, see modifiers.apply_modifiers
 
     Returns:
     - total cost (resource loss + send penalty)
     """
 
+    tribe_data = load_profile(profile).troops_table[tribe]
+
     if max_troop_limit:
         for troop, count in troop_counts.items():
             if count > max_troop_limit.get(troop, float("inf")):
@@ -89,18 +95,18 @@ def loss_function(tribe: str,
         return float("inf") # Punish infinitely
 
     # Step 1: Loss %
-    loss_percent = count_loss_percentage(tribe, troop_counts, troop_levels, oasis_composition)
+    loss_percent = count_loss_percentage(tribe, troop_counts, troop_levels, oasis_composition, profile, modifiers)
 
     # Step 2: Penalty from loss troops cost
     loss_cost_penalty = 0
     for troop, count in troop_counts.items():
         troop_loss = round(count * loss_percent / 100)
-        loss_cost_penalty += troop_loss * TROOPS_TABLE[tribe][troop]["cost"]
+        loss_cost_penalty += troop_loss * tribe_data[troop]["cost"]
 
     # Step 3: Penalty from army count
     army_size_penalty = 0
     for troop, count in troop_counts.items():
-        troop_type = TROOPS_TABLE[tribe][troop]["type"]
+        troop_type = tribe_data[troop]["type"]
         if troop_type == "infantry":
             army_size_penalty += count
         elif troop_type == "cavalry":
@@ -127,6 +133,137 @@ def loss_function_vectorized(x, tribe, troops, troop_levels, oasis_composition,
         max_troop_limit=max_troop_limit
     )
 
+class _SearchStopped(Exception):
+    """Raised from the objective to end a dual_annealing run, carries the result message"""
+
+def anneal(problem, bounds, max_iter, seed, count_infeasible=False, callback=None, deadline=None, should_stop=None):
+    """
+    One dual_annealing run on a compiled problem
+
+    Parameters:
+    - count_infeasible: count the evaluations that score float("inf"), off by default since
+      it wraps every objective call
+    - callback: optional callback(best_counts, best_score) as in run_simulated_annealing
+    - deadline: optional time.monotonic() value, the first evaluation past it ends the run
+      with the best army evaluated so far once a feasible one was seen. CLOCK_MONOTONIC is
+      system-wide on Linux, so pool workers can share the caller's deadline
+    - should_stop: optional no-argument callable polled before every evaluation, returning
+      True ends the run like the deadline does
+
+    Returns a dict with best_counts, best_score, nfev, iterations (None when the deadline or
+    should_stop hit), infeasible_evaluations, message and converged (False when the deadline,
+    should_stop or the callback cut the run short)
+    """
+
+    # scipy.optimize takes longer to import than the rest of the API together, load it on first use
+    from scipy.optimize import dual_annealing
+
+    troops = problem.troops
+    objective = problem.objective
+    calls = {"nfev": 0, "infeasible": 0, "best_score": math.inf, "best_x": None, "stopped": False}
+    if count_infeasible or deadline is not None or should_stop is not None:
+        def objective(x):
+            if calls["best_x"] is not None:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise _SearchStopped("Time budget reached")
+                if should_stop is not None and should_stop():
+                    raise _SearchStopped("Stopped")
+            value = problem.objective(x)
+            calls["nfev"] += 1
+            if math.isinf(value):
+                calls["infeasible"] += 1
+            elif value < calls["best_score"]:
+                calls["best_score"], calls["best_x"] = value, list(x)
+            return value
+
+    # dual_annealing reports each new minimum, returning True halts it
+    def on_minimum(x, f, context):
+        calls["stopped"] = bool(callback({troops[i]: int(round(x[i])) for i in range(len(troops))}, f))
+        return calls["stopped"]
+
+    try:
+        result = dual_annealing(
+            objective,
+            bounds=bounds,
+            maxiter=max_iter,
+            seed=seed,
+            callback=on_minimum if callback is not None else None
+        )
+    except _SearchStopped as stop:
+        x = calls["best_x"]
+        return {
+            "best_counts": {troops[i]: int(round(x[i])) for i in range(len(troops))},
+            "best_score": float(calls["best_score"]),
+            "nfev": calls["nfev"],
+            "iterations": None,
+            "infeasible_evaluations": calls["infeasible"] if count_infeasible else None,
+            "message": str(stop),
+            "converged": False
+        }
+
+    message = result.message
+    return {
+        "best_counts": {troops[i]: int(round(result.x[i])) for i in range(len(troops))},
+        "best_score": float(result.fun),
+        "nfev": int(result.nfev),
+        "iterations": int(result.nit),
+        "infeasible_evaluations": calls["infeasible"] if count_infeasible else None,
+        "message": "; ".join(message) if isinstance(message, (list, tuple)) else str(message),
+        "converged": not calls["stopped"]
+    }
+
+def _anneal_start(args):
+    """Worker entry point, one start of anneal_multistart"""
+
+    return anneal(*args)
+
+def anneal_multistart(problem, bounds, max_iter, seeds, count_infeasible=False, callback=None, deadline=None,
+                      should_stop=None):
+    """
+    Independent anneal runs, one per seed, spread over the shared process pool so K starts
+    on K cores take the wall time of one
+
+    The callback sees each start's army as it finishes when it beats the earlier ones,
+    returning True drops the starts that have not begun yet. Inside a worker process (a
+    job_queue job, a batch task) the starts run one after another, the caller's pool already
+    keeps the cores busy and pools are not nested. There should_stop reaches every evaluation,
+    pool workers cannot receive it and it is polled between starts instead.
+
+    Returns the list of anneal results in seed order, None for dropped starts
+    """
+
+    sequential = worker_pool.MAX_WORKERS == 1 or multiprocessing.parent_process() is not None
+    tasks = [(problem, bounds, max_iter, seed, count_infeasible, None, deadline, should_stop if sequential else None)
+             for seed in seeds]
+    runs = [None] * len(tasks)
+    best_score = math.inf
+    stopped = False
+
+    def collect(index, run):
+        nonlocal best_score, stopped
+        runs[index] = run
+        if callback is not None and not stopped and run["best_score"] < best_score:
+            best_score = run["best_score"]
+            stopped = bool(callback(run["best_counts"], run["best_score"]))
+        stopped = stopped or (should_stop is not None and bool(should_stop()))
+        return stopped
+
+    if sequential:
+        for index, task in enumerate(tasks):
+            if collect(index, _anneal_start(task)):
+                break
+        return runs
+
+    pool = worker_pool.get_pool()
+    futures = {pool.submit(_anneal_start, task): index for index, task in enumerate(tasks)}
+    for future in as_completed(futures):
+        if future.cancelled():
+            continue
+        if collect(futures[future], future.result()):
+            for pending in futures:
+                pending.cancel()
+    return runs
+
 def run_simulated_annealing(tribe: str,
                             troops: list,
                             troop_levels: dict,
@@ -135,35 +272,182 @@ def run_simulated_annealing(tribe: str,
                             army_size_penalty_coefficient: float = 3.0,
                             cavalry_penalty_coefficient: float = 10.0,
                             max_iter: int = 100,
-                            seed: int = 42):
+                            seed: int = 42,
+                            engine: str = "auto",
+                            callback=None,
+                            diagnostics: bool = False,
+                            warm_start: dict = None,
+                            starts: int = 1,
+                            time_budget_ms: float = None,
+                            profile: str = DEFAULT_PROFILE,
+                            modifiers: dict = None,
+                            should_stop=None):
     """
     Simulated Annealing
-    """
 
-    # Step 1: Define bounds for each troop
-    bounds = [(0, max_troop_limit[troop]) for troop in troops]
-
-    # Step 2: Run optimizer
-    result = dual_annealing(
-        lambda x: loss_function_vectorized(
-            x,
-            tribe,
-            troops,
-            troop_levels,
-            oasis_composition,
-            army_size_penalty_coefficient,
-            cavalry_penalty_coefficient,
-            max_troop_limit
-        ),
-        bounds=bounds,
-        maxiter=max_iter,
-        seed=seed
-    )
+    Parameters:
+    - engine: "auto" picks one: the exact engine for armies of at most EXACT_DISPATCH_TROOPS
+      troops, where it is faster than any other and provably optimal even with a warm_start,
+      annealing otherwise and whenever several starts are asked for,
+      "annealing" runs scipy dual_annealing (max_iter, seed),
+      "exact" runs the integer branch-and-bound search and returns the provable optimum,
+      "table" refines the precomputed armies of lookup_table and falls back to annealing
+      when no table covers the configuration or the oasis
+    - callback: optional callback(best_counts, best_score) run whenever the search finds a
+      better army, returning True stops it early with the best army so far
+    - diagnostics: adds a "diagnostics" block to the result, see below
+    - warm_start: optional best_counts of a previous run on slightly different inputs, the
+      annealing and table engines then re-optimize from it with warm_start.reoptimize instead
+      of searching from scratch, the exact engine ignores it
+    - starts: independent annealing runs with seeds seed, seed + 1, ... run in parallel by
+      anneal_multistart, the best army wins and a "multistart" block reports every start's
+      objective_score and their spread; other engines ignore it
+    - time_budget_ms: optional wall-time budget of the whole call, the annealing and exact
+      engines return the best feasible army found when it runs out; table lookups and warm
+      starts take milliseconds and ignore it
+    - profile: server profile whose troop and animal stats are used, the precomputed tables
+      cover the default profile only so the table engine falls back to annealing on others
+    - modifiers: optional hero, item and alliance attack bonuses, folded into the attack vector
+      once by modifiers.apply_modifiers so every engine scores armies at the usual cost; the
+      tables hold unmodified armies, so the table engine falls back to annealing with them
+    - should_stop: optional no-argument callable polled before every annealing evaluation and
+      every exact-search block, returning True stops the search with the best army so far,
+      unlike the callback it does not wait for the next improvement
+
+    The result's "converged" is False when the budget or the callback cut the search short:
+    the annealing engine did not finish max_iter, or the exact engine did not prove optimality.
+    Table answers are always False, the local refinement may stop short of the optimum.
+
+    The diagnostics block holds:
+    - engine: the engine that produced the army, "annealing" after a table fallback and
+      "warm_start" for warm-started runs
+    - nfev: objective evaluations (complete armies scored by the exact engine), None for table hits
+    - iterations: annealing iterations, partial armies bounded by the exact engine or
+      warm-start rounds
+    - infeasible_evaluations: evaluations that scored float("inf")
+    - message: convergence message of the engine
+    - phases_ms: wall time of "setup", "search" and "postprocess"
+    """
 
-    # Step 3: Decode result
-    best_counts = {troops[i]: int(round(result.x[i])) for i in range(len(troops))}
-    best_score = result.fun
-    loss_percent = count_loss_percentage(tribe, best_counts, troop_levels, oasis_composition)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    if starts < 1:
+        raise ValueError(f"starts must be at least 1, got {starts}")
+    if time_budget_ms is not None and time_budget_ms <= 0:
+        raise ValueError(f"time_budget_ms must be positive, got {time_budget_ms}")
+
+    deadline = time.monotonic() + time_budget_ms / 1000 if time_budget_ms is not None else None
+    phases_ms = {"setup": 0.0}
+    info = {"nfev": None, "iterations": None, "infeasible_evaluations": None, "message": None}
+    converged = True
+    start = time.perf_counter()
+
+    if engine == "auto":
+        small = len(troops) <= EXACT_DISPATCH_TROOPS and starts == 1
+        engine = "exact" if small else "annealing"
+    if warm_start is not None and engine != "exact":
+        engine = "warm_start"
+
+    if engine == "table" and (profile != DEFAULT_PROFILE or has_effect(modifiers)):
+        engine = "annealing"
+    if engine == "table":
+        found = lookup_army(
+            tribe=tribe,
+            troops=troops,
+            troop_levels=troop_levels,
+            oasis_composition=oasis_composition,
+            max_troop_limit=max_troop_limit,
+            army_size_penalty_coefficient=army_size_penalty_coefficient,
+            cavalry_penalty_coefficient=cavalry_penalty_coefficient
+        )
+        if found is None:
+            engine = "annealing"
+            phases_ms["table_lookup"] = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+        else:
+            best_counts, best_score = found
+            # The refinement around the grid armies is local, its army is not proven optimal
+            converged = False
+            info["message"] = "refined from precomputed table, not proven optimal"
+
+    if engine in ("exact", "annealing", "warm_start"):
+        # Step 1: Compile the problem and define bounds for each troop
+        problem = compile_problem(
+            tribe=tribe,
+            troops=troops,
+            troop_levels=troop_levels,
+            oasis_composition=oasis_composition,
+            max_troop_limit=max_troop_limit,
+            army_size_penalty_coefficient=army_size_penalty_coefficient,
+            cavalry_penalty_coefficient=cavalry_penalty_coefficient,
+            profile=profile,
+            modifiers=modifiers
+        )
+        bounds = [(0, max_troop_limit[troop]) for troop in troops]
+        phases_ms["setup"] = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+
+    if engine == "exact":
+        stats = {}
+        best_counts, best_score = solve_problem(problem, callback, stats, deadline, should_stop=should_stop)
+        converged = not stats["stopped"]
+        if stats["stopped"]:
+            message = "stopped before proving optimality"
+        else:
+            message = "optimal" if math.isfinite(best_score) else "no feasible army"
+        info.update(
+            nfev=stats["evaluations"],
+            iterations=stats["nodes"],
+            infeasible_evaluations=stats["infeasible"],
+            message=message
+        )
+    elif engine == "warm_start":
+        stats = {}
+        best_counts, best_score = reoptimize(problem, warm_start, stats)
+        if callback is not None:
+            callback(best_counts, best_score)
+        info.update(
+            nfev=stats["evaluations"],
+            iterations=stats["rounds"],
+            infeasible_evaluations=stats["infeasible"],
+            message="refined from warm start"
+        )
+    elif engine == "annealing":
+        # Step 2: Run optimizer on the compiled problem, same values as loss_function_vectorized
+        if starts == 1:
+            runs = [anneal(problem, bounds, max_iter, seed, diagnostics, callback, deadline, should_stop)]
+        else:
+            runs = anneal_multistart(problem, bounds, max_iter, range(seed, seed + starts), diagnostics, callback, deadline,
+                                     should_stop)
+
+        # Step 3: Decode result, ties go to the earliest seed
+        finished = [(index, run) for index, run in enumerate(runs) if run is not None]
+        best_index, best_run = min(finished, key=lambda item: (item[1]["best_score"], item[0]))
+        best_counts, best_score = best_run["best_counts"], best_run["best_score"]
+        converged = len(finished) == len(runs) and all(run["converged"] for _, run in finished)
+        info.update(
+            nfev=sum(run["nfev"] for _, run in finished),
+            iterations=sum(run["iterations"] or 0 for _, run in finished),
+            infeasible_evaluations=sum(run["infeasible_evaluations"] for _, run in finished) if diagnostics else None,
+            message=best_run["message"]
+        )
+        if starts > 1:
+            scores = [run["best_score"] for _, run in finished]
+            finite = [score for score in scores if math.isfinite(score)]
+            multistart = {
+                "starts": starts,
+                "finished": len(finished),
+                "best_seed": seed + best_index,
+                "objective_scores": [run["best_score"] if run is not None else None for run in runs],
+                "objective_spread": max(finite) - min(finite) if finite else None,
+                "objective_stdev": statistics.pstdev(finite) if finite else None
+            }
+
+    phases_ms["search"] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+
+    loss_percent = count_loss_percentage(tribe, best_counts, troop_levels, oasis_composition, profile, modifiers)
+    tribe_data = load_profile(profile).troops_table[tribe]
 
     # Step 4: Calculate troop loss and cost
     troop_losses = {}
@@ -171,17 +455,54 @@ def run_simulated_annealing(tribe: str,
     for troop, count in best_counts.items():
         troop_loss = round(count * loss_percent / 100)
         troop_losses[troop] = troop_loss
-        cost_per_unit = TROOPS_TABLE[tribe][troop]["cost"]
+        cost_per_unit = tribe_data[troop]["cost"]
         total_loss_cost += troop_loss * cost_per_unit
 
-    return {
+    result = {
         "best_counts": best_counts,
         "objective_score": best_score,
         "loss_percent": loss_percent,
         "troop_losses": troop_losses,
-        "total_loss_cost": total_loss_cost
+        "total_loss_cost": total_loss_cost,
+        "converged": converged
     }
 
+    if engine == "annealing" and starts > 1:
+        result["multistart"] = multistart
+
+    if diagnostics:
+        phases_ms["postprocess"] = (time.perf_counter() - start) * 1000
+        result["diagnostics"] = {"engine": engine, **info, "phases_ms": phases_ms}
+
+    return result
+
+def warm_up():
+    """
+    Loads the solver backends and runs each engine once on a small problem, so the first
+    request of a fresh process does not pay for imports and first-call setup
+
+    Returns the wall time per engine in milliseconds
+    """
+
+    army = {
+        "tribe": "Teuton",
+        "troop_levels": {"Clubswinger": 1, "Axeman": 1, "Teutonic_Knight": 1},
+        "oasis_composition": {"Rat": 5, "Spider": 2},
+        "max_troop_limit": {"Clubswinger": 50, "Axeman": 20, "Teutonic_Knight": 10}
+    }
+    runs = {
+        "annealing": dict(troops=["Clubswinger", "Axeman", "Teutonic_Knight"], engine="annealing", max_iter=5),
+        "exact": dict(troops=["Clubswinger", "Teutonic_Knight"], engine="exact"),
+        "table": dict(troops=["Clubswinger", "Axeman", "Teutonic_Knight"], engine="table", max_iter=5)
+    }
+
+    timings = {}
+    for engine, options in runs.items():
+        start = time.perf_counter()
+        run_simulated_annealing(**army, **options)
+        timings[engine] = (time.perf_counter() - start) * 1000
+    return timings
+
 # # Testing
 # if __name__ == "__main__":
 #     # Example inputs
@@ -0,0 +1,115 @@
+import numpy as np
+
+from lookup_table import refine_army
+
+# Rounds of line scans and window refinement before settling on the best army found
+WARM_START_ROUNDS = 4
+
+# Slack in units of the second troop around each equal-power exchange
+EXCHANGE_SLACK = 1
+
+def _count(stats, scores):
+    stats["evaluations"] = stats.get("evaluations", 0) + len(scores)
+    stats["infeasible"] = stats.get("infeasible", 0) + int(np.isinf(scores).sum())
+
+def exchange_lines(problem, army, caps):
+    """
+    Armies reached from `army` by trading troop i for troop j at roughly equal total power,
+    for every ordered pair. Optima of neighbouring problems mostly move along these ridges,
+    since the loss ratio depends on the army through its power and defense mix only.
+    """
+
+    blocks = []
+    slack = np.arange(-EXCHANGE_SLACK, EXCHANGE_SLACK + 1)
+    for i in range(len(caps)):
+        deltas = np.arange(-army[i], caps[i] - army[i] + 1)
+        for j in range(len(caps)):
+            if i == j or problem.attack[j] <= 0:
+                continue
+            offsets = -np.rint(deltas * problem.attack[i] / problem.attack[j]).astype(np.int64)
+            armies = np.tile(army, (len(deltas) * len(slack), 1))
+            armies[:, i] += np.repeat(deltas, len(slack))
+            armies[:, j] += (offsets[:, None] + slack[None, :]).ravel()
+            blocks.append(armies[(armies[:, j] >= 0) & (armies[:, j] <= caps[j])])
+    return np.concatenate(blocks) if blocks else np.empty((0, len(caps)), dtype=np.int64)
+
+def _descend(problem, army, caps, stats, rounds=WARM_START_ROUNDS, refine=True):
+    """Line scans, equal-power exchanges and refine_army from one army until a round stalls"""
+
+    scores, _, _ = problem.evaluate(army[None, :])
+    _count(stats, scores)
+    best_score = float(scores[0])
+
+    for _ in range(rounds):
+        stats["rounds"] += 1
+        start_score = best_score
+
+        # Step 1: Full single-troop lines, they carry the big moves a changed coefficient needs
+        for i in range(len(caps)):
+            armies = np.tile(army, (caps[i] + 1, 1))
+            armies[:, i] = np.arange(caps[i] + 1)
+            scores, _, _ = problem.evaluate(armies)
+            _count(stats, scores)
+            best = int(np.argmin(scores))
+            if scores[best] < best_score:
+                army, best_score = armies[best], float(scores[best])
+
+        # Step 2: Equal-power exchanges between two troops
+        armies = exchange_lines(problem, army, caps)
+        if len(armies):
+            scores, _, _ = problem.evaluate(armies)
+            _count(stats, scores)
+            best = int(np.argmin(scores))
+            if scores[best] < best_score:
+                army, best_score = armies[best], float(scores[best])
+
+        # Step 3: Joint moves of two troops around the line optimum
+        refined = refine_army(problem, army[None, :], stats) if refine else None
+        if refined is not None and refined[1] < best_score:
+            army, best_score = np.array(refined[0]), refined[1]
+
+        if best_score >= start_score:
+            break
+
+    return army, best_score
+
+def reoptimize(problem, previous_counts: dict, stats: dict = None):
+    """
+    Incremental re-optimization from the best army of a slightly different problem, e.g. after
+    one coefficient or one oasis animal changed. Each round scans every count of each troop
+    with the others fixed, walks the equal-power exchange lines of every troop pair, where the
+    optimum usually moves, and runs refine_army around the result, until a round finds nothing
+    better. A change can also tip the optimum over to another troop mix, so the best
+    single-troop armies get one cheap round of lines and exchanges too, and the full descent
+    continues from any of them that beats the warm-started army. Either way it takes a
+    fraction of a cold annealing run.
+
+    Parameters:
+    - problem: compiled problem, its limits must be finite
+    - previous_counts: dict of troop name to count, troops missing from it start at 0 and
+      counts are clipped to the limits
+    - stats: optional dict that gets "evaluations", "infeasible" and "rounds" added to it
+
+    Returns (best_counts, best_score)
+    """
+
+    stats = {} if stats is None else stats
+    stats["rounds"] = 0
+    troops = problem.troops
+    caps = np.array([max(0, int(limit)) for limit in problem.limits])
+    seeds = [np.clip([int(previous_counts.get(troop, 0)) for troop in troops], 0, caps)]
+
+    for i in range(len(troops)):
+        armies = np.zeros((caps[i] + 1, len(troops)), dtype=np.int64)
+        armies[:, i] = np.arange(caps[i] + 1)
+        scores, _, _ = problem.evaluate(armies)
+        _count(stats, scores)
+        seeds.append(armies[int(np.argmin(scores))])
+
+    best_army, best_score = _descend(problem, seeds[0], caps, stats)
+    for seed in seeds[1:]:
+        army, score = _descend(problem, np.asarray(seed, dtype=np.int64), caps, stats, rounds=1, refine=False)
+        if score < best_score:
+            best_army, best_score = _descend(problem, army, caps, stats)
+
+    return {troop: int(count) for troop, count in zip(troops, best_army)}, best_score
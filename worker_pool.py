@@ -0,0 +1,36 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker processes shared by batch endpoints and precompute jobs, one per core by default
+MAX_WORKERS = os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Process pool shared by every caller, started on first use since spawning workers is slow"""
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        return _pool
+
+def _ready():
+    return os.getpid()
+
+def start_workers():
+    """
+    Starts every worker of the shared pool now rather than on the first batch. Call it after
+    warming up the parent: forked workers inherit its loaded modules and skip the imports.
+    """
+
+    pool = get_pool()
+    for future in [pool.submit(_ready) for _ in range(MAX_WORKERS)]:
+        future.result()
+
+def chunksize_for(tasks: int):
+    """Tasks handed to a worker at once, a few chunks per worker keeps them evenly loaded"""
+
+    return max(1, tasks // (4 * MAX_WORKERS))